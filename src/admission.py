@@ -0,0 +1,242 @@
+"""Контроль допуска: ограничение одновременных запросов по классам маршрутов.
+
+Каждый класс (чтения, изменения, вход/регистрация и смена пароля с bcrypt, постановка задач)
+получает свой лимит одновременных запросов. Лимит адаптивный: задержка ответа сравнивается с
+базовой (задержкой без нагрузки) того же маршрута, и рост задержки сверх
+ADMISSION_LATENCY_TOLERANCE раз - это очередь ниже по стеку (пул потоков, пул соединений, Redis),
+поэтому лимит снижается; пока задержка в норме, лимит растет до заданного максимума. Базовая
+задержка своя у каждого шаблона маршрута: в одном классе бывают маршруты с разной стоимостью, и
+общий минимум принимал бы обычный медленный маршрут за перегрузку. Запросы сверх лимита ждут в
+короткой очереди не дольше ADMISSION_QUEUE_BUDGET_MS (или базовой задержки самого медленного
+маршрута класса, если она больше), затем сразу получают 503 с Retry-After, а не копятся до
+таймаутов.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config import settings
+from src.metrics import ADMISSION_LIMIT, ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+
+# Не ограничиваются: проверки здоровья, метрики и документация должны отвечать и под нагрузкой
+EXEMPT_PREFIXES = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+READS = "reads"
+WRITES = "writes"
+AUTH = "auth"
+IMPORTS = "imports"
+TASKS = "tasks"
+STREAMS = "streams"
+
+# Ключ задержек для запросов, не совпавших ни с одним маршрутом (404)
+UNMATCHED_ROUTE = "unmatched"
+
+# Доля сглаживания нового лимита и минимальная доля лимита от максимума
+SMOOTHING = 0.2
+MIN_LIMIT_FRACTION = 0.1
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Класс маршрута по методу и пути; None - запрос без ограничений"""
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path == "/users/import":
+        # Импорт хеширует пароли всего файла и идет минутами: отдельный фиксированный лимит
+        return IMPORTS
+    if path in ("/auth/login", "/auth/register") or path.endswith("/change-password"):
+        return AUTH
+    if method == "PUT" and path.count("/") == 2 and path.startswith("/users/"):
+        # Обновление пользователя хеширует пароль, если он передан
+        return AUTH
+    if path == "/tasks/events" or path == "/users/export" or (path.startswith("/task/") and path.endswith("/wait")):
+        # Long-poll, SSE и выгрузка: длительность задает клиент, поэтому лимит фиксированный
+        return STREAMS
+    if method == "POST" and (path == "/add" or path.startswith("/process-text")):
+        return TASKS
+    if method in ("GET", "HEAD") or path == "/tasks/status":
+        return READS
+    # refresh/logout, массовые операции администратора, смена роли, удаление
+    return WRITES
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Адаптивный лимит одновременных запросов с ограниченной по времени очередью"""
+
+    def __init__(self, name: str, max_limit: int, queue_budget: float, adaptive: bool = True):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, math.ceil(self.max_limit * MIN_LIMIT_FRACTION))
+        self.limit = float(self.max_limit)
+        self.queue_budget = queue_budget
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Шаблон маршрута -> [задержка без нагрузки (медленно дрейфует вверх), сглаженная текущая], секунды
+        self._routes: Dict[str, List[float]] = {}
+        # Сглаженная задержка по всему классу и базовая задержка самого медленного маршрута
+        self.baseline: Optional[float] = None
+        self.recent: Optional[float] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        ADMISSION_LIMIT.labels(name).set(self.limit)
+
+    def _retry_after(self) -> int:
+        """Оценка времени разбора очереди, секунды"""
+        if self.recent is None:
+            return 1
+        return max(1, math.ceil(self.recent * (len(self._waiters) + 1) / max(1, int(self.limit))))
+
+    def _reject(self) -> Overloaded:
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(self.name).inc()
+        return Overloaded(self._retry_after())
+
+    async def acquire(self) -> float:
+        """Занять место; вернуть время ожидания в очереди или выбросить Overloaded"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return 0.0
+        # Очередь не длиннее текущего лимита: дольше бюджета ее все равно не разобрать
+        if len(self._waiters) >= int(self.limit):
+            raise self._reject()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        # Не меньше одного обычного запроса класса: иначе медленный класс (bcrypt) отказывал бы
+        # при любой очереди, даже когда место освободится через одно время обслуживания
+        budget = max(self.queue_budget, self.baseline or 0.0)
+        try:
+            await asyncio.wait_for(waiter, budget)
+        except asyncio.TimeoutError:
+            raise self._reject()
+        except asyncio.CancelledError:
+            # Место могло быть передано прямо перед отменой: вернуть его следующему
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+        waited = time.perf_counter() - started
+        self.queued += 1
+        self.admitted += 1
+        ADMISSION_QUEUE_WAIT.labels(self.name).observe(waited)
+        return waited
+
+    def _release_slot(self) -> None:
+        """Передать место первому живому ожидающему или освободить его"""
+        while self._waiters and self.in_flight <= int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def release(self, latency: float, route: str = UNMATCHED_ROUTE) -> None:
+        if self.adaptive:
+            self._update_limit(latency, route)
+        self._release_slot()
+
+    def _update_limit(self, latency: float, route: str) -> None:
+        """Градиент: отношение допустимой задержки маршрута к его текущей, плюс запас sqrt(limit) для роста"""
+        timings = self._routes.get(route)
+        if timings is None:
+            timings = self._routes[route] = [latency, latency]
+        else:
+            if latency < timings[0]:
+                timings[0] = latency
+            else:
+                timings[0] += (latency - timings[0]) * 0.001
+            timings[1] += (latency - timings[1]) * 0.1
+        baseline, recent = timings
+        # Маршрутов в классе единицы-десятки: максимум дешевле отдельного учета
+        self.baseline = max(timings[0] for timings in self._routes.values())
+        self.recent = latency if self.recent is None else self.recent + (latency - self.recent) * 0.1
+
+        gradient = max(0.5, min(1.0, settings.ADMISSION_LATENCY_TOLERANCE * baseline / max(recent, 1e-6)))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - SMOOTHING) + target * SMOOTHING
+        self.limit = min(self.max_limit, max(self.min_limit, limit))
+        ADMISSION_LIMIT.labels(self.name).set(self.limit)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 1),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "baseline_ms": round(self.baseline * 1000, 3) if self.baseline is not None else None,
+            "recent_ms": round(self.recent * 1000, 3) if self.recent is not None else None,
+            "routes": {
+                route: {"baseline_ms": round(baseline * 1000, 3), "recent_ms": round(recent * 1000, 3)}
+                for route, (baseline, recent) in self._routes.items()
+            },
+        }
+
+
+_budget = settings.ADMISSION_QUEUE_BUDGET_MS / 1000
+limiters: Dict[str, AdaptiveLimiter] = {
+    READS: AdaptiveLimiter(READS, settings.ADMISSION_READ_LIMIT, _budget),
+    WRITES: AdaptiveLimiter(WRITES, settings.ADMISSION_WRITE_LIMIT, _budget),
+    AUTH: AdaptiveLimiter(AUTH, settings.ADMISSION_AUTH_LIMIT, _budget),
+    IMPORTS: AdaptiveLimiter(IMPORTS, settings.ADMISSION_IMPORT_LIMIT, _budget, adaptive=False),
+    TASKS: AdaptiveLimiter(TASKS, settings.ADMISSION_TASK_LIMIT, _budget),
+    STREAMS: AdaptiveLimiter(STREAMS, settings.ADMISSION_STREAM_LIMIT, _budget, adaptive=False),
+}
+
+
+def admission_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI-middleware: допуск запроса по лимиту его класса или быстрый отказ 503"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[name]
+        try:
+            await limiter.acquire()
+        except Overloaded as error:
+            response = JSONResponse(
+                {"detail": "Server is busy, try again later"},
+                status_code=503,
+                headers={"Retry-After": str(error.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Маршрут известен после обработки: роутер кладет его в scope
+            route = scope.get("route")
+            key = f"{scope['method']} {route.path}" if route is not None else UNMATCHED_ROUTE
+            limiter.release(time.perf_counter() - started, key)
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from typing import List
 
 from src.auth import schemas, services
-from src.database import get_db
+from src.auth.throttling import client_ip, login_throttle
+from src.database import get_db, DB_ASYNC, ThreadpoolService
+from src.security import oauth2_scheme, verify_token
+from src.token_revocation import revocation_store
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Асинхронный сервис для AsyncSession, синхронный выполняется в пуле потоков
+user_service = services.AsyncUserService if DB_ASYNC else ThreadpoolService(services.UserService)
+
 @router.post("/register", response_model=schemas.UserResponse)
-def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
     """Регистрация нового пользователя"""
     try:
-        user = services.UserService.create_user(db, user_data)
+        user = await user_service.create_user(db, user_data)
         return user
     except HTTPException as e:
         raise e
@@ -23,10 +28,14 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: schemas.UserLogin, request: Request, db: Session = Depends(get_db)):
     """Вход пользователя в систему"""
+    # До запроса к БД и bcrypt: сессия get_db не открывает соединение, пока ее не используют
+    await login_throttle.check(user_data.username, client_ip(request))
     try:
-        return services.UserService.login_user(db, user_data)
+        tokens = await user_service.login_user(db, user_data)
+        await login_throttle.reset_user(user_data.username)
+        return tokens
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -37,12 +46,20 @@ def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh")
-def refresh_tokens(refresh_data: schemas.RefreshTokenRequest):
+async def refresh_tokens(refresh_data: schemas.RefreshTokenRequest):
     """Обновление access и refresh токенов"""
-    return services.UserService.refresh_tokens(refresh_data.refresh_token)
+    return await services.UserService.refresh_tokens(refresh_data.refresh_token)
 
 
 @router.post("/logout")
-def logout():
-    """Выход из системы"""
-    return {"message": "Successfully logged out. Please remove tokens from client storage."}
+async def logout(token: str = Depends(oauth2_scheme)):
+    """Выход из системы: токен и все токены этого входа отзываются"""
+    payload = verify_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    await revocation_store.revoke_session(payload)
+    return {"message": "Successfully logged out"}
@@ -1,12 +1,16 @@
 from typing import Any, List
 
 from fastapi import HTTPException, status
+from sqlalchemy import select, insert
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
 from src.auth.schemas import UserCreate, UserLogin
 from src.users.models import User
-from src.security import get_password_hash, verify_password, create_access_token, create_refresh_token, verify_token
+from src.users.services import integrity_error_detail
+from src.security import get_password_hash_pooled, verify_password_pooled, get_password_hash_async, verify_password_async, create_access_token, create_refresh_token, verify_token, new_token_id
+from src.token_revocation import revocation_store
 
 
 class UserService:
@@ -35,24 +39,20 @@ class UserService:
     def create_user(db: Session, user_data: UserCreate) -> User:
         """Создать нового пользователя"""
         try:
-            if db.query(User).filter(User.username == user_data.username).first():
-                raise HTTPException(status_code=400, detail="Username already taken")
-
-            if db.query(User).filter(User.email == user_data.email).first():
-                raise HTTPException(status_code=400, detail="Email already taken")
-
-            hashed_password = get_password_hash(user_data.password)
-
-            db_user = User(
-                username=user_data.username,
-                email=user_data.email,
-                password=hashed_password,
-                role=user_data.role
-            )
-
-            db.add(db_user)
+            hashed_password = get_password_hash_pooled(user_data.password)
+
+            # Занятость username/email проверяют уникальные ограничения таблицы
+            db_user = db.execute(
+                insert(User).values(
+                    username=user_data.username,
+                    email=user_data.email,
+                    password=hashed_password,
+                    role=user_data.role
+                ).returning(User)
+            ).scalars().one()
+            # Отсоединяем строку RETURNING, чтобы commit не сбросил ее атрибуты
+            db.expunge(db_user)
             db.commit()
-            db.refresh(db_user)
 
             return db_user
 
@@ -61,7 +61,7 @@ class UserService:
             raise
         except IntegrityError as e:
             db.rollback()
-            raise HTTPException(status_code=400, detail="Database integrity error")
+            raise HTTPException(status_code=400, detail=integrity_error_detail(e))
         except SQLAlchemyError as e:
             db.rollback()
             raise HTTPException(
@@ -82,7 +82,10 @@ class UserService:
         user = db.query(User).filter(User.username == username).first()
         if not user:
             return None
-        if not verify_password(password, user.password):
+        # Транзакция закрывается до bcrypt: ожидание пула хеширования не держит соединение БД
+        db.expunge(user)
+        db.rollback()
+        if not verify_password_pooled(password, user.password):
             return None
         return user
 
@@ -94,8 +97,10 @@ class UserService:
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
 
-        access_token = create_access_token({"sub": str(user.id)})
-        refresh_token = create_refresh_token({"sub": str(user.id)})
+        # Токены одного входа - одно семейство: выход и повтор refresh-токена отзывают его целиком
+        claims = {"sub": str(user.id), "fam": new_token_id()}
+        access_token = create_access_token(claims)
+        refresh_token = create_refresh_token(claims)
 
         return {
             "access_token": access_token,
@@ -114,18 +119,107 @@ class UserService:
         
 
     @staticmethod
-    def refresh_tokens(refresh_token: str) -> dict:
-        """Обновление access и refresh токенов"""
-        payload = verify_token(refresh_token, "refresh")
-        if not payload:
+    async def refresh_tokens(refresh_token: str) -> dict:
+        """Обновление access и refresh токенов; старый refresh-токен становится недействительным"""
+        payload = verify_token(refresh_token)
+        if not payload or payload.get("type") != "refresh":
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-        user_id = payload.get("sub")
-        new_access_token = create_access_token({"sub": user_id})
-        new_refresh_token = create_refresh_token({"sub": user_id})
+        new_jti = new_token_id()
+        await revocation_store.rotate(payload, new_jti)
+
+        claims = {"sub": payload.get("sub"), "fam": payload["fam"]}
+        new_access_token = create_access_token(claims)
+        new_refresh_token = create_refresh_token({**claims, "jti": new_jti})
 
         return {
             "access_token": new_access_token,
             "refresh_token": new_refresh_token,
             "token_type": "bearer"
-        }
\ No newline at end of file
+        }
+
+
+class AsyncUserService:
+    """Асинхронная версия UserService для AsyncSession"""
+
+    @staticmethod
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> User:
+        """Получить пользователя по ID"""
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
+        """Создать нового пользователя"""
+        try:
+            hashed_password = await get_password_hash_async(user_data.password)
+
+            # Занятость username/email проверяют уникальные ограничения таблицы
+            result = await db.execute(
+                insert(User).values(
+                    username=user_data.username,
+                    email=user_data.email,
+                    password=hashed_password,
+                    role=user_data.role
+                ).returning(User)
+            )
+            db_user = result.scalars().one()
+            await db.commit()
+
+            return db_user
+
+        except HTTPException:
+            await db.rollback()
+            raise
+        except IntegrityError as e:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail=integrity_error_detail(e))
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Database error occurred"
+            )
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error creating user"
+            )
+
+    @staticmethod
+    async def authenticate_user(db: AsyncSession, username: str, password: str) -> User:
+        """Аутентификация пользователя"""
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
+        if not user:
+            return None
+        # Транзакция закрывается до bcrypt: ожидание пула хеширования не держит соединение БД
+        db.expunge(user)
+        await db.rollback()
+        if not await verify_password_async(password, user.password):
+            return None
+        return user
+
+    @staticmethod
+    async def login_user(db: AsyncSession, user_data: UserLogin) -> dict:
+        """Вход пользователя в систему"""
+        user = await AsyncUserService.authenticate_user(db, user_data.username, user_data.password)
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+
+        # Токены одного входа - одно семейство: выход и повтор refresh-токена отзывают его целиком
+        claims = {"sub": str(user.id), "fam": new_token_id()}
+        access_token = create_access_token(claims)
+        refresh_token = create_refresh_token(claims)
+
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "bearer",
+            "user_id": user.id,
+            "username": user.username,
+            "role": user.role.value
+        }
@@ -0,0 +1,206 @@
+"""Ограничение попыток входа до проверки пароля.
+
+Token bucket на имя пользователя и на IP клиента: каждая попытка входа забирает по токену из
+обоих ведер, токены восстанавливаются с постоянной скоростью. Если в каком-либо ведре токенов
+нет, запрос отклоняется с 429 до запроса к БД и bcrypt. Ведра хранятся в Redis и меняются одним
+Lua-скриптом (проверка и списание атомарны для всех процессов); с LOGIN_THROTTLE_BACKEND=local
+или при недоступности Redis используются ведра в памяти процесса.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import List, Tuple
+
+from fastapi import HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from src.cache import TTLCache
+from src.config import settings
+from src.database import WEB_CONCURRENCY
+from src.metrics import LOGIN_THROTTLED
+from src.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_KEY_PREFIX = "login-throttle:"
+
+LOCAL_THROTTLE = settings.LOGIN_THROTTLE_BACKEND == "local"
+if LOCAL_THROTTLE and WEB_CONCURRENCY > 1:
+    # Ведра каждого процесса свои: фактический лимит в WEB_CONCURRENCY раз выше заданного
+    logger.warning("LOGIN_THROTTLE_BACKEND=local with %d processes multiplies login limits", WEB_CONCURRENCY)
+
+# KEYS - ведра, ARGV - пары (емкость, токенов в секунду). Возвращает {1, 0, 0}, если токены
+# списаны из всех ведер, иначе {0, номер пустого ведра, секунд до токена} без изменений.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local blocked, wait = 0, 0
+for i = 1, #KEYS do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local left = tonumber(bucket[1])
+    if left == nil then
+        left = capacity
+    else
+        left = math.min(capacity, left + math.max(0, now - tonumber(bucket[2])) * rate)
+    end
+    tokens[i] = left
+    if left < 1 and (1 - left) / rate > wait then
+        blocked, wait = i, (1 - left) / rate
+    end
+end
+if blocked > 0 then
+    return {0, blocked, tostring(wait)}
+end
+for i = 1, #KEYS do
+    local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', KEYS[i], 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', KEYS[i], math.ceil(capacity / rate))
+end
+return {1, 0, '0'}
+"""
+
+# (ключ, емкость, токенов в секунду)
+Bucket = Tuple[str, float, float]
+
+
+class LocalBuckets:
+    """Те же ведра в памяти процесса"""
+
+    def __init__(self, maxsize: int):
+        # Запись живет не дольше полного восстановления самого медленного ведра
+        ttl = max(capacity / rate for capacity, rate in (_user_limits(), _ip_limits()))
+        self._buckets = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def take(self, buckets: List[Bucket]) -> Tuple[int, float]:
+        """0 и 0, если токены списаны; иначе номер пустого ведра (с 1) и секунд до токена"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = []
+            blocked, wait = 0, 0.0
+            for index, (key, capacity, rate) in enumerate(buckets, 1):
+                left, updated = self._buckets.get(key, (capacity, now))
+                left = min(capacity, left + (now - updated) * rate)
+                tokens.append(left)
+                if left < 1 and (1 - left) / rate > wait:
+                    blocked, wait = index, (1 - left) / rate
+            if blocked:
+                return blocked, wait
+            for (key, capacity, rate), left in zip(buckets, tokens):
+                self._buckets.set(key, (left - 1, now), ttl=capacity / rate)
+            return 0, 0.0
+
+    def reset(self, key: str) -> None:
+        self._buckets.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def _user_limits() -> Tuple[float, float]:
+    return settings.LOGIN_USER_BURST, settings.LOGIN_USER_PER_MINUTE / 60
+
+
+def _ip_limits() -> Tuple[float, float]:
+    return settings.LOGIN_IP_BURST, settings.LOGIN_IP_PER_MINUTE / 60
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class LoginThrottle:
+    """Проверка ведер пользователя и IP перед входом; сброс ведра пользователя после успешного входа"""
+
+    SCOPES = ("username", "ip")
+
+    def __init__(self):
+        self._local = LocalBuckets(settings.LOGIN_THROTTLE_LOCAL_SIZE)
+        self._script = None
+        self._redis_down = False
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "throttled_username": 0, "throttled_ip": 0, "redis_fallbacks": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _user_key(username: str) -> str:
+        # Хеш вместо имени: длина ключа не зависит от ввода, имена не видны в Redis
+        digest = hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+        return f"{THROTTLE_KEY_PREFIX}user:{digest}"
+
+    def _buckets(self, username: str, ip: str) -> List[Bucket]:
+        return [
+            (self._user_key(username), *_user_limits()),
+            (f"{THROTTLE_KEY_PREFIX}ip:{ip}", *_ip_limits()),
+        ]
+
+    async def _take_redis(self, buckets: List[Bucket]) -> Tuple[int, float]:
+        if self._script is None:
+            self._script = get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+        args = [value for _, capacity, rate in buckets for value in (capacity, rate)]
+        allowed, blocked, wait = await self._script(
+            keys=[key for key, _, _ in buckets], args=args, client=get_redis()
+        )
+        return (0, 0.0) if allowed else (int(blocked), float(wait))
+
+    async def _take(self, buckets: List[Bucket]) -> Tuple[int, float]:
+        if LOCAL_THROTTLE:
+            return self._local.take(buckets)
+        try:
+            result = await self._take_redis(buckets)
+        except RedisError as error:
+            self._count("redis_fallbacks")
+            if not self._redis_down:
+                logger.warning("Login throttling falls back to in-process buckets: %s", error)
+                self._redis_down = True
+            return self._local.take(buckets)
+        self._redis_down = False
+        return result
+
+    async def check(self, username: str, ip: str) -> None:
+        """Списать попытку входа или отклонить ее с 429 и Retry-After"""
+        if not settings.LOGIN_THROTTLE_ENABLED:
+            return
+        blocked, wait = await self._take(self._buckets(username, ip))
+        if not blocked:
+            self._count("allowed")
+            return
+        scope = self.SCOPES[blocked - 1]
+        self._count(f"throttled_{scope}")
+        LOGIN_THROTTLED.labels(scope).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    async def reset_user(self, username: str) -> None:
+        """После успешного входа ошибки ввода пароля больше не ограничивают пользователя"""
+        if not settings.LOGIN_THROTTLE_ENABLED:
+            return
+        key = self._user_key(username)
+        self._local.reset(key)
+        if LOCAL_THROTTLE:
+            return
+        try:
+            await get_redis().delete(key)
+        except RedisError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "local" if LOCAL_THROTTLE or self._redis_down else "redis",
+                **self._stats,
+                "local_buckets": len(self._local),
+            }
+
+
+login_throttle = LoginThrottle()
@@ -1,6 +1,10 @@
 from celery import Celery
+from kombu import Exchange, Queue
 import os
 
+from src.result_storage import COMPACT_SERIALIZER
+import src.queue_metrics  # noqa: F401  учет времени ожидания задач в очереди
+
 # Используем переменные окружения
 redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
@@ -8,15 +12,78 @@ celery_app = Celery(
     'worker',
     broker=redis_url,
     backend=redis_url,
-    include=['app.tasks']
+    include=['src.tasks']
 )
 
+# Формат хранения результатов: json или compact (msgpack + сжатие больших значений)
+result_serializer = os.getenv('RESULT_SERIALIZER', 'json')
+
+# Очереди по классам задержки: короткие задачи не ждут за длинными
+FAST_QUEUE = 'fast'
+SLOW_QUEUE = 'slow'
+
+# Приоритеты в Redis: 0 - наивысший, 9 - наименьший
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ':'
+
+# Профили воркеров: очереди, автомасштабирование (max,min), prefetch и подтверждение после выполнения.
+# Выбирается переменной CELERY_WORKER_PROFILE при запуске воркера
+WORKER_PROFILES = {
+    FAST_QUEUE: {
+        'queues': FAST_QUEUE,
+        'autoscale': '8,2',
+        'prefetch_multiplier': 4,
+        'acks_late': False,
+    },
+    SLOW_QUEUE: {
+        'queues': SLOW_QUEUE,
+        'autoscale': '4,1',
+        'prefetch_multiplier': 1,
+        'acks_late': True,
+    },
+}
+
 # Настройки
 celery_app.conf.update(
     task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    accept_content=['json', COMPACT_SERIALIZER],
+    result_serializer=result_serializer,
+    # Время жизни результатов по умолчанию; задачи могут задать свое через result_ttl
+    result_expires=int(os.getenv('RESULT_EXPIRES', '3600')),
     timezone='Europe/Moscow',
     enable_utc=True,
-    broker_connection_retry_on_startup=True
-)
\ No newline at end of file
+    broker_connection_retry_on_startup=True,
+    # Размер пула соединений/продюсеров брокера для публикации из API
+    broker_pool_limit=int(os.getenv('BROKER_POOL_LIMIT', '10')),
+    # Маршрутизация задач по очередям
+    task_queues=[
+        Queue(FAST_QUEUE, Exchange(FAST_QUEUE), routing_key=FAST_QUEUE),
+        Queue(SLOW_QUEUE, Exchange(SLOW_QUEUE), routing_key=SLOW_QUEUE),
+    ],
+    task_default_queue=FAST_QUEUE,
+    task_routes={
+        'src.tasks.add_numbers': {'queue': SLOW_QUEUE},
+        'src.tasks.process_text': {'queue': FAST_QUEUE},
+        'src.tasks.process_text_batch': {'queue': FAST_QUEUE},
+        'src.tasks.merge_text_results': {'queue': FAST_QUEUE},
+    },
+    task_default_priority=5,
+    broker_transport_options={
+        'queue_order_strategy': 'priority',
+        'priority_steps': PRIORITY_STEPS,
+        'sep': PRIORITY_SEP,
+    },
+    # Задача, потерянная вместе с воркером, возвращается в очередь
+    task_reject_on_worker_lost=True,
+)
+
+worker_profile = os.getenv('CELERY_WORKER_PROFILE')
+if worker_profile:
+    profile = WORKER_PROFILES[worker_profile]
+    celery_app.conf.update(
+        worker_prefetch_multiplier=profile['prefetch_multiplier'],
+        task_acks_late=profile['acks_late'],
+    )
+    # Значения по умолчанию для опций `celery worker` (-Q, --autoscale); явные опции важнее
+    os.environ.setdefault('CELERY_WORKER_QUEUES', profile['queues'])
+    os.environ.setdefault('CELERY_WORKER_AUTOSCALE', profile['autoscale'])
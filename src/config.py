@@ -11,6 +11,68 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 180
     REFRESH_TOKEN_EXPIRE_DAYS: int = 60
 
+    # Пул для bcrypt: thread (bcrypt отпускает GIL) или process
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+
+    # Кеш аутентифицированных пользователей для get_current_user
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 30
+
+    # Кеш проверенных JWT
+    JWT_CACHE_SIZE: int = 50000
+    JWT_CACHE_TTL_SECONDS: int = 300
+
+    # Публикация задач Celery: потоки публикации и окно микробатчинга (0 - без батчинга)
+    TASK_PUBLISH_WORKERS: int = 4
+    TASK_PUBLISH_BATCH_MS: float = 0
+    TASK_PUBLISH_MAX_BATCH: int = 100
+    # Исполнение задач: celery (брокер Redis) или local (пул процессов и результаты в памяти).
+    # local - только для одного процесса приложения (WEB_CONCURRENCY=1), иначе запуск отклоняется
+    TASK_BACKEND: str = "celery"
+    LOCAL_TASK_WORKERS: int = os.cpu_count() or 1
+
+    # Учет запросов к БД: порог медленного запроса, число одинаковых запросов для N+1, доля логируемых
+    DB_SLOW_QUERY_MS: float = 100
+    DB_N_PLUS_ONE_THRESHOLD: int = 5
+    DB_LOG_SAMPLE_RATE: float = 0.1
+
+    # Быстрый JSON: orjson по умолчанию и сериализация пользователей без повторной валидации FastAPI
+    FAST_JSON: bool = False
+
+    # Отзыв токенов: хранилище redis (общее для процессов) или local (память одного процесса,
+    # только при WEB_CONCURRENCY=1); емкость и доля ложных срабатываний фильтра Блума, период полной
+    # синхронизации с Redis; число семейств refresh-токенов в памяти для TOKEN_REVOCATION_BACKEND=local
+    TOKEN_REVOCATION_BACKEND: str = "redis"
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_RESYNC_SECONDS: float = 300
+    TOKEN_FAMILY_LOCAL_SIZE: int = 100000
+
+    # Ограничение попыток входа (token bucket): запас попыток и восстановление в минуту
+    # на имя пользователя и на IP; хранилище ведер redis (общее для процессов) или local (память
+    # процесса); размер ведер в памяти для local и на время недоступности Redis
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_THROTTLE_BACKEND: str = "redis"
+    LOGIN_USER_BURST: int = 10
+    LOGIN_USER_PER_MINUTE: float = 5
+    LOGIN_IP_BURST: int = 50
+    LOGIN_IP_PER_MINUTE: float = 30
+    LOGIN_THROTTLE_LOCAL_SIZE: int = 100000
+
+    # Контроль допуска: максимум одновременных запросов по классам маршрутов (адаптивный лимит не выше),
+    # бюджет ожидания в очереди до 503 и допустимый рост задержки относительно базовой
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_READ_LIMIT: int = 100
+    ADMISSION_WRITE_LIMIT: int = 50
+    ADMISSION_AUTH_LIMIT: int = (os.cpu_count() or 1) * 4
+    ADMISSION_IMPORT_LIMIT: int = 2
+    ADMISSION_TASK_LIMIT: int = 50
+    ADMISSION_STREAM_LIMIT: int = 200
+    ADMISSION_QUEUE_BUDGET_MS: float = 200
+    ADMISSION_LATENCY_TOLERANCE: float = 2.0
+
     CORS_ORIGINS: list = ["http://localhost", "http://localhost:3000", "http://localhost:8000"]
 
     class Config:
@@ -1,31 +1,115 @@
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+import logging
 import os
+from contextlib import AsyncExitStack, ExitStack
+from uuid import uuid4
+
+import anyio.to_thread
+from sqlalchemy.pool import NullPool
+
+from src.db_metrics import instrument_engine
+from src.db_pool import TimedAsyncAdaptedQueuePool, TimedQueuePool, pool_stats
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DB_USER = os.environ.get("DB_USER")
 DB_PASSWORD = os.environ.get("DB_PASSWORD")
 DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT")
 DB_NAME = os.environ.get("DB_NAME")
 
+# Асинхронный режим работы с БД (asyncpg). DB_ASYNC=false возвращает синхронный путь через psycopg2
+DB_ASYNC = os.environ.get("DB_ASYNC", "true").lower() in ("1", "true", "yes")
+# Логирование каждого SQL-запроса (echo) - только для отладки
+DB_ECHO = os.environ.get("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+
+def database_url(driver: str, host: str = f"{DB_HOST}:{DB_PORT}") -> str:
+    return f"postgresql+{driver}://{DB_USER}:{DB_PASSWORD}@{host}/{DB_NAME}"
+
+
 # Используйте синхронный драйвер PostgreSQL
-SQLALCHEMY_DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+SQLALCHEMY_DATABASE_URL = database_url("psycopg2")
+# Асинхронный драйвер PostgreSQL
+SQLALCHEMY_ASYNC_DATABASE_URL = database_url("asyncpg")
+
+# Бюджет соединений с Postgres на все процессы этой роли (API или Celery) и число процессов.
+# Пул каждого процесса получает свою долю, чтобы N воркеров не исчерпали max_connections
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "30"))
+WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+_connections_per_process = max(2, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", _connections_per_process // 2))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", _connections_per_process - DB_POOL_SIZE))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Проверка соединения перед выдачей и пересоздание старых соединений (секунды, -1 - не пересоздавать)
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+# Соединений, открываемых при старте приложения
+DB_POOL_PREWARM = int(os.environ.get("DB_POOL_PREWARM", DB_POOL_SIZE))
+# Режим transaction pooling PgBouncer: без своего пула и без именованных prepared statements
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+# Потоков для синхронных обработчиков: не больше, чем соединений в пуле
+THREADPOOL_SIZE = int(os.environ.get(
+    "THREADPOOL_SIZE", 40 if DB_ASYNC or DB_PGBOUNCER else DB_POOL_SIZE + DB_MAX_OVERFLOW
+))
+
+
+def engine_options(pool_class) -> dict:
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
 
-# Синхронный движок
+# Имена prepared statements уникальны: за PgBouncer соединение меняется между транзакциями
+ASYNC_CONNECT_ARGS = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+} if DB_PGBOUNCER else {}
+
+
+# Синхронный движок (alembic, celery, синхронный режим API)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    echo=True,
-    pool_size=10,
-    max_overflow=20
+    echo=DB_ECHO,
+    **engine_options(TimedQueuePool)
 )
 
+# Асинхронный движок
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    echo=DB_ECHO,
+    connect_args=ASYNC_CONNECT_ARGS,
+    **engine_options(TimedAsyncAdaptedQueuePool)
+)
+
+# Учет числа и времени запросов в рамках HTTP-запроса
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession
+)
 Base = declarative_base()
 
-def get_db():
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
@@ -33,4 +117,85 @@ def get_db():
         db.rollback()
         raise e
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            await db.rollback()
+            raise e
+
+
+# Зависимость сессии для роутеров выбирается настройкой DB_ASYNC
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+def get_session_factory():
+    """Фабрика сессий для потоковых ответов: сессия get_db закрывается до отправки тела ответа"""
+    return AsyncSessionLocal if DB_ASYNC else SessionLocal
+
+
+class ThreadpoolService:
+    """Асинхронная обертка над синхронным сервисом: методы выполняются в пуле потоков"""
+
+    def __init__(self, service):
+        self._service = service
+
+    def __getattr__(self, name):
+        method = getattr(self._service, name)
+
+        async def wrapper(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        return wrapper
+
+
+def active_engine():
+    """Движок, через который работают запросы API при текущем DB_ASYNC"""
+    return async_engine.sync_engine if DB_ASYNC else engine
+
+
+def get_pool_stats() -> dict:
+    return {
+        "mode": "pgbouncer" if DB_PGBOUNCER else "pool",
+        "workers": WEB_CONCURRENCY,
+        "max_connections": DB_MAX_CONNECTIONS,
+        "threadpool_limit": THREADPOOL_SIZE,
+        **pool_stats(active_engine().pool),
+    }
+
+
+def align_threadpool() -> None:
+    """Ограничить пул потоков anyio, чтобы синхронные обработчики не ждали соединения молча"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+def _prewarm_sync(count: int) -> None:
+    with ExitStack() as stack:
+        for _ in range(count):
+            stack.enter_context(engine.connect())
+
+
+async def prewarm_pool() -> None:
+    """Открыть DB_POOL_PREWARM соединений до первого запроса (все одновременно, затем вернуть в пул)"""
+    count = 0 if DB_PGBOUNCER else min(DB_POOL_PREWARM, DB_POOL_SIZE)
+    if count <= 0:
+        return
+    try:
+        if DB_ASYNC:
+            async with AsyncExitStack() as stack:
+                for _ in range(count):
+                    await stack.enter_async_context(async_engine.connect())
+        else:
+            await anyio.to_thread.run_sync(_prewarm_sync, count)
+    except Exception:
+        logger.warning("Database is not reachable, pool connections will be opened on demand")
+
+
+async def dispose_engines() -> None:
+    """Закрыть соединения пулов при остановке"""
+    await async_engine.dispose()
+    engine.dispose()
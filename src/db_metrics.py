@@ -0,0 +1,133 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Запросы к БД в рамках одного HTTP-запроса"""
+
+    __slots__ = ("count", "total_seconds", "statements", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.statements: Counter = Counter()
+        self.slow: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_seconds += elapsed
+        self.statements[statement] += 1
+        if elapsed * 1000 >= settings.DB_SLOW_QUERY_MS:
+            self.slow.append((statement, elapsed))
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """Одинаковые запросы, повторенные не меньше порога N+1"""
+        return [
+            (statement, count) for statement, count in self.statements.items()
+            if count >= settings.DB_N_PLUS_ONE_THRESHOLD
+        ]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+_lock = threading.Lock()
+_totals = {"requests": 0, "queries": 0, "db_seconds": 0.0, "n_plus_one_requests": 0, "slow_queries": 0}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключить учет запросов к движку (для async-движка - к его sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _sample() -> bool:
+    return random.random() < settings.DB_LOG_SAMPLE_RATE
+
+
+def _report(scope: Scope, stats: QueryStats) -> None:
+    method = scope["method"]
+    path = getattr(scope.get("route"), "path", scope["path"])
+    repeated = stats.repeated()
+
+    with _lock:
+        _totals["requests"] += 1
+        _totals["queries"] += stats.count
+        _totals["db_seconds"] += stats.total_seconds
+        _totals["slow_queries"] += len(stats.slow)
+        if repeated:
+            _totals["n_plus_one_requests"] += 1
+
+    if repeated and _sample():
+        for statement, count in repeated:
+            logger.warning("Possible N+1 in %s %s: %d identical queries: %s",
+                           method, path, count, statement)
+    if stats.slow and _sample():
+        for statement, elapsed in stats.slow:
+            logger.warning("Slow query in %s %s (%.1f ms): %s",
+                           method, path, elapsed * 1000, statement)
+
+
+class DBQueryMiddleware:
+    """ASGI-middleware: число запросов и время БД на запрос в заголовках X-DB-Query-Count и X-DB-Time-Ms"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Заголовки уходят до тела: запросы потоковых ответов в них не попадают
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["X-DB-Time-Ms"] = f"{stats.total_seconds * 1000:.2f}"
+            await send(message)
+
+        token = _current.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+        _report(scope, stats)
+
+
+def db_stats() -> dict:
+    with _lock:
+        requests = _totals["requests"]
+        return {
+            **_totals,
+            "db_seconds": round(_totals["db_seconds"], 3),
+            "avg_queries_per_request": round(_totals["queries"] / requests, 2) if requests else 0.0,
+            "avg_db_ms_per_request": round(_totals["db_seconds"] / requests * 1000, 2) if requests else 0.0,
+        }
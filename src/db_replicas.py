@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import math
+import os
+import time
+from typing import List, Optional
+
+import anyio.to_thread
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.cache import TTLCache
+from src.database import (
+    ASYNC_CONNECT_ARGS, DB_ASYNC, DB_ECHO, database_url, engine_options, get_db, get_session_factory,
+)
+from src.db_metrics import instrument_engine
+from src.db_pool import TimedAsyncAdaptedQueuePool, TimedQueuePool, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Реплики для чтения: host[:port] через запятую, с теми же пользователем и базой, что и основная БД
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+# Реплика с отставанием больше порога исключается из чтения до следующей проверки
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "2"))
+# Окно read-your-writes: после записи клиент читает с основной БД
+DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# 0, если реплика догнала все полученные WAL; NULL на сервере не в режиме восстановления
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    """Реплика: движок, фабрика сессий и последнее измеренное отставание"""
+
+    def __init__(self, name: str, engine, sessions):
+        self.name = name
+        self.engine = engine
+        self.sessions = sessions
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.error: Optional[str] = None
+
+    @classmethod
+    def from_host(cls, host: str) -> "Replica":
+        if ":" not in host:
+            host = f"{host}:{os.environ.get('DB_PORT', '5432')}"
+        if DB_ASYNC:
+            engine = create_async_engine(
+                database_url("asyncpg", host), echo=DB_ECHO, connect_args=ASYNC_CONNECT_ARGS,
+                **engine_options(TimedAsyncAdaptedQueuePool)
+            )
+            instrument_engine(engine.sync_engine)
+            sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+        else:
+            engine = create_engine(database_url("psycopg2", host), echo=DB_ECHO, **engine_options(TimedQueuePool))
+            instrument_engine(engine)
+            sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return cls(host, engine, sessions)
+
+    @property
+    def _sync_engine(self):
+        return self.engine.sync_engine if isinstance(self.engine, AsyncEngine) else self.engine
+
+    def _measure_lag_sync(self) -> float:
+        with self.engine.connect() as conn:
+            return float(conn.execute(LAG_QUERY).scalar() or 0)
+
+    async def measure_lag(self) -> float:
+        if self._sync_engine.dialect.name != "postgresql":
+            # Локальные заглушки (SQLite) не реплицируются
+            return 0.0
+        if not isinstance(self.engine, AsyncEngine):
+            return await anyio.to_thread.run_sync(self._measure_lag_sync)
+        async with self.engine.connect() as conn:
+            return float((await conn.execute(LAG_QUERY)).scalar() or 0)
+
+    async def check(self) -> None:
+        try:
+            self.lag = await self.measure_lag()
+            self.error = None
+        except Exception as error:
+            self.lag = None
+            self.error = str(error)
+        healthy = self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG_SECONDS
+        if healthy != self.healthy:
+            logger.warning("Replica %s is %s (lag=%s, error=%s)", self.name,
+                           "back in rotation" if healthy else "excluded from reads", self.lag, self.error)
+        self.healthy = healthy
+
+    async def dispose(self) -> None:
+        if isinstance(self.engine, AsyncEngine):
+            await self.engine.dispose()
+        else:
+            self.engine.dispose()
+
+
+class ReplicaSet:
+    """Выбор реплики для чтения по кругу среди тех, чье отставание в пределах порога"""
+
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "read_your_writes": 0, "fallbacks": 0}
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def check(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def _check_forever(self) -> None:
+        while True:
+            await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+            await self.check()
+
+    async def start(self) -> None:
+        """Первая проверка до приема запросов, затем периодическая в фоне"""
+        if not self.replicas:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            await replica.dispose()
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "replicas": [
+                {"name": replica.name, "healthy": replica.healthy, "lag_seconds": replica.lag,
+                 "error": replica.error, **pool_stats(replica._sync_engine.pool)}
+                for replica in self.replicas
+            ],
+        }
+
+
+replica_set = ReplicaSet([Replica.from_host(host) for host in DB_REPLICA_HOSTS])
+
+# Клиенты без cookie (API с Bearer-токеном): недавние записи по хешу заголовка Authorization.
+# Кеш свой у каждого процесса: при WEB_CONCURRENCY > 1 чтение после записи попадает на основную
+# БД, только если придет в тот же процесс; гарантию для всех процессов дает лишь cookie.
+recent_writers = TTLCache(maxsize=10000, ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+
+def _client_key(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization")
+    return hashlib.sha256(authorization.encode()).hexdigest() if authorization else None
+
+
+def _wrote_recently(request: Request) -> bool:
+    try:
+        if float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    key = _client_key(request)
+    return key is not None and recent_writers.get(key) is not None
+
+
+def _choose_replica(request: Request) -> Optional[Replica]:
+    """Реплика для чтения или None, если читать нужно с основной БД"""
+    if not replica_set.replicas:
+        return None
+    if _wrote_recently(request):
+        replica_set.stats["read_your_writes"] += 1
+        return None
+    replica = replica_set.choose()
+    if replica is None:
+        replica_set.stats["fallbacks"] += 1
+    return replica
+
+
+async def get_async_read_db(request: Request, primary: AsyncSession = Depends(get_db)):
+    """Сессия для чтения: реплика, если она доступна и клиент ничего не писал недавно.
+
+    Сессия основной БД создается лениво и без запросов соединение не занимает.
+    """
+    replica = _choose_replica(request)
+    if replica is None:
+        replica_set.stats["primary_reads"] += 1
+        yield primary
+        return
+    replica_set.stats["replica_reads"] += 1
+    async with replica.sessions() as db:
+        yield db
+
+
+def get_sync_read_db(request: Request, primary: Session = Depends(get_db)):
+    replica = _choose_replica(request)
+    if replica is None:
+        replica_set.stats["primary_reads"] += 1
+        yield primary
+        return
+    replica_set.stats["replica_reads"] += 1
+    db = replica.sessions()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Зависимость для обработчиков только на чтение
+get_read_db = get_async_read_db if DB_ASYNC else get_sync_read_db
+
+
+def get_read_session_factory(request: Request, primary=Depends(get_session_factory)):
+    """Фабрика сессий для потоковых чтений с той же маршрутизацией, что и get_read_db"""
+    replica = _choose_replica(request)
+    if replica is None:
+        replica_set.stats["primary_reads"] += 1
+        return primary
+    replica_set.stats["replica_reads"] += 1
+    return replica.sessions
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """После успешного запроса на запись клиент на DB_READ_YOUR_WRITES_SECONDS читает с основной БД"""
+    response = await call_next(request)
+    if replica_set.replicas and request.method in WRITE_METHODS and response.status_code < 400:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE, f"{time.time() + DB_READ_YOUR_WRITES_SECONDS:.3f}",
+            max_age=math.ceil(DB_READ_YOUR_WRITES_SECONDS), httponly=True, samesite="lax",
+        )
+        key = _client_key(request)
+        if key is not None:
+            recent_writers.set(key, True)
+    return response
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from celery import Signature, Task, chord, group, states
+from celery.utils import uuid
+
+from src.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+def _run_task(name: str, args: tuple, kwargs: dict):
+    """Выполнение задачи в дочернем процессе по имени"""
+    import src.tasks  # noqa: F401  регистрирует задачи в дочернем процессе
+    return celery_app.tasks[name](*args, **kwargs)
+
+
+class LocalTaskExecutor:
+    """Выполнение задач Celery без брокера: пул процессов и результаты в памяти процесса.
+
+    Интерфейс совпадает с TaskPublisher, статусы и id задач - с бэкендом Celery.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # task_id -> (meta, время истечения)
+        self._results: Dict[str, Tuple[dict, float]] = {}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # Ключи дедупликации: ключ -> (task_id, время истечения)
+        self._claims: Dict[str, Tuple[str, float]] = {}
+        self._running = 0
+        self.published = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for task_id in [key for key, (_, expires) in self._results.items() if expires <= now]:
+            del self._results[task_id]
+        for key in [key for key, (_, expires) in self._claims.items() if expires <= now]:
+            del self._claims[key]
+
+    def _store(self, task: Task, task_id: str, status: str, result=None) -> None:
+        ttl = getattr(task, 'result_ttl', None) or celery_app.conf.result_expires
+        meta = {
+            "task_id": task_id,
+            "task": task.name,
+            "status": status,
+            "result": result,
+            "date_done": time.time() if status in states.READY_STATES else None,
+        }
+        self._results[task_id] = (meta, time.monotonic() + ttl)
+
+    async def _execute(self, task: Task, args: tuple, kwargs: dict, task_id: str):
+        loop = asyncio.get_running_loop()
+        waiter = self._waiters.setdefault(task_id, loop.create_future())
+        started = time.perf_counter()
+        self._running += 1
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(), _run_task, task.name, tuple(args), dict(kwargs)
+            )
+        except Exception as error:
+            logger.exception("Local task %s[%s] failed", task.name, task_id)
+            self.failed += 1
+            self._store(task, task_id, states.FAILURE, error)
+            raise
+        else:
+            self._store(task, task_id, states.SUCCESS, result)
+            return result
+        finally:
+            self._running -= 1
+            self.total_seconds += time.perf_counter() - started
+            self._waiters.pop(task_id, None)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _schedule(self, coro) -> None:
+        future = asyncio.ensure_future(coro)
+        # Ошибка уже сохранена в результате задачи
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    def _start(self, task: Task, args: tuple, kwargs: dict, task_id: Optional[str]) -> str:
+        task_id = task_id or uuid()
+        self._purge()
+        self._store(task, task_id, states.PENDING)
+        self._waiters[task_id] = asyncio.get_running_loop().create_future()
+        self.published += 1
+        return task_id
+
+    async def enqueue(self, task: Task, *args, **kwargs) -> str:
+        return await self.publish(task, args, kwargs)
+
+    async def publish(self, task: Task, args: tuple, kwargs: dict, task_id: Optional[str] = None) -> str:
+        """Запуск задачи в пуле процессов; результат доступен по id, как в Celery"""
+        task_id = self._start(task, args, kwargs, task_id)
+        self._schedule(self._execute(task, args, kwargs, task_id))
+        return task_id
+
+    def _prepare(self, signature: Signature):
+        """Зарегистрировать задачи canvas и вернуть корутину его выполнения"""
+        if isinstance(signature, chord):
+            header = [self._prepare(item) for item in signature.tasks]
+            body = signature.body
+            task = celery_app.tasks[body.task]
+            task_id = self._start(task, body.args, body.kwargs, body.options.get('task_id'))
+
+            async def run_chord():
+                try:
+                    results = await asyncio.gather(*header)
+                except Exception as error:
+                    self._store(task, task_id, states.FAILURE, error)
+                    self._waiters.pop(task_id).set_result(None)
+                    raise
+                return await self._execute(task, (results, *body.args), body.kwargs, task_id)
+            return run_chord()
+
+        if isinstance(signature, group):
+            return asyncio.gather(*[self._prepare(item) for item in signature.tasks])
+
+        task = celery_app.tasks[signature.task]
+        task_id = self._start(task, signature.args, signature.kwargs, signature.options.get('task_id'))
+        return self._execute(task, signature.args, signature.kwargs, task_id)
+
+    async def publish_signature(self, signature: Signature) -> None:
+        """Выполнение group/chord: части параллельно в пуле, callback после всех частей"""
+        self._schedule(self._prepare(signature))
+
+    def get_meta(self, task_id: str) -> Optional[dict]:
+        item = self._results.get(task_id)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def set_meta(self, task_id: str, meta: dict) -> None:
+        if task_id in self._results:
+            self._results[task_id] = (meta, self._results[task_id][1])
+
+    def completion(self, task_id: str) -> Optional[asyncio.Future]:
+        """Future, завершающийся вместе с задачей; None, если задача не выполняется"""
+        return self._waiters.get(task_id)
+
+    def claim(self, key: str, task_id: str, ttl: int) -> bool:
+        """Аналог SET NX EX для дедупликации задач"""
+        self._purge()
+        if key in self._claims:
+            return False
+        self._claims[key] = (task_id, time.monotonic() + ttl)
+        return True
+
+    def get_claim(self, key: str) -> Optional[str]:
+        item = self._claims.get(key)
+        return item[0] if item and item[1] > time.monotonic() else None
+
+    def drop_claim(self, key: str) -> None:
+        self._claims.pop(key, None)
+
+    def result_stats(self) -> Dict[str, dict]:
+        """Результаты, хранящиеся сейчас в памяти, по типам задач"""
+        counts = Counter(meta["task"] for meta, _ in self._results.values())
+        return {name: {"results_stored": count} for name, count in counts.items()}
+
+    def queue_stats(self) -> Dict[str, dict]:
+        running = min(self._running, self.workers)
+        return {"local": {"depth": len(self._waiters) - running, "running": running}}
+
+    def warm_up(self) -> None:
+        """Запустить процессы пула заранее, до первого запроса"""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(time.sleep, 0)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        executed = self.published - len(self._waiters)
+        return {
+            "backend": "local",
+            "published": self.published,
+            "running": self._running,
+            "failed": self.failed,
+            "stored_results": len(self._results),
+            "avg_run_ms": round(self.total_seconds / executed * 1000, 2) if executed > 0 else 0.0,
+        }
@@ -1,16 +1,61 @@
+import json
 import logging
+from contextlib import asynccontextmanager
+from typing import List
 
-from celery.result import AsyncResult
-from fastapi import FastAPI
+from fastapi import Body, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from src.tasks import add_numbers, process_text
+from src.admission import AdmissionMiddleware, admission_stats
+from src.config import settings
+from src.database import align_threadpool, dispose_engines, get_pool_stats, prewarm_pool
+from src.db_replicas import read_your_writes_middleware, replica_set
 from src.users import user_router
 from src.auth import auth_router
+from src.auth.throttling import login_throttle
+from src.security import password_hasher, user_cache, token_cache
+from src.task_queue import task_publisher
+from src.token_revocation import revocation_store
+from src.db_metrics import DBQueryMiddleware, db_stats
+from src.redis_client import close_redis
+from src.metrics import (
+    MetricsMiddleware, instrument_pools, mark_process_dead, metrics_endpoint, start_runtime_metrics,
+    stop_runtime_metrics,
+)
+from src.task_dedup import submit_task, dedup_stats
+from src.text_batches import split_document, submit_text_batch
+from src.task_results import (
+    get_task_results, iter_task_results, wait_for_task_result, release_task_result,
+    get_result_write_stats, get_queue_stats
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    align_threadpool()
+    task_publisher.warm_up()
+    await prewarm_pool()
+    await replica_set.start()
+    await revocation_store.start()
+    await start_runtime_metrics()
+    yield
+    await stop_runtime_metrics()
+    await revocation_store.stop()
+    task_publisher.shutdown()
+    password_hasher.shutdown()
+    await close_redis()
+    await replica_set.stop()
+    await dispose_engines()
+    mark_process_dead()
+
 
 app = FastAPI(
     title="My Project API",
     description="Большой проект с модульной структурой",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if settings.FAST_JSON else JSONResponse
 )
 
 # Настройка CORS
@@ -22,6 +67,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Число запросов к БД и время БД на каждый запрос
+app.add_middleware(DBQueryMiddleware)
+# Чтение с основной БД сразу после записи того же клиента; без реплик не нужно
+if replica_set.replicas:
+    app.middleware("http")(read_your_writes_middleware)
+# Ограничение одновременных запросов по классам маршрутов и быстрый отказ 503 при перегрузке
+if settings.ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware)
+# Метрики Prometheus по шаблонам маршрутов (внешний слой, учитывает все остальные)
+app.add_middleware(MetricsMiddleware)
+instrument_pools()
+
 app.include_router(user_router)
 app.include_router(auth_router)
 
@@ -33,28 +90,63 @@ logger = logging.getLogger(__name__)
 @app.post("/add")
 async def add(a: int, b: int):
     """Запуск асинхронной задачи сложения"""
-    task = add_numbers.delay(a, b)
-    return {"task_id": task.id, "message": "Task started"}
+    return await submit_task(add_numbers, a, b)
 
 
 @app.post("/process-text")
 async def process_text_endpoint(text: str):
     """Запуск обработки текста"""
-    task = process_text.delay(text)
-    return {"task_id": task.id, "message": "Text processing started"}
+    return await submit_task(process_text, text)
+
+
+@app.post("/process-text/batch")
+async def process_text_batch_endpoint(texts: List[str] = Body(..., embed=True, min_length=1, max_length=10000)):
+    """Обработка множества текстов пачками; части можно получать через /tasks/events"""
+    return await submit_text_batch(texts)
+
+
+@app.post("/process-text/document")
+async def process_document_endpoint(request: Request):
+    """Обработка большого документа из тела запроса, разбитого на части"""
+    chunks = await split_document(request.stream())
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Document is empty")
+    return await submit_text_batch(chunks, document=True)
 
 
 @app.get("/task/{task_id}")
-async def get_task_result(task_id: str):
-    """Получение результата задачи"""
-    task_result = AsyncResult(task_id)
+async def get_task_result(task_id: str, release: bool = False):
+    """Получение результата задачи; release=true удаляет крупные поля из хранилища после ответа"""
+    response = (await get_task_results([task_id]))[0]
+    if release and response["ready"]:
+        await release_task_result(task_id)
+    return response
+
+
+@app.get("/task/{task_id}/wait")
+async def wait_task_result(task_id: str, timeout: float = Query(30, gt=0, le=60)):
+    """Long-poll: ответ приходит, когда задача завершится, или по истечении timeout"""
+    return await wait_for_task_result(task_id, timeout)
+
+
+@app.post("/tasks/status")
+async def get_tasks_status(task_ids: List[str] = Body(..., embed=True, max_length=1000)):
+    """Статусы нескольких задач одним запросом к Redis"""
+    return await get_task_results(task_ids)
 
-    return {
-        "task_id": task_id,
-        "status": task_result.state,
-        "result": task_result.result if task_result.state == 'SUCCESS' else None,
-        "ready": task_result.ready()
-    }
+
+@app.get("/tasks/events")
+async def task_events(
+        task_ids: List[str] = Query(..., max_length=100),
+        timeout: float = Query(60, gt=0, le=300)
+):
+    """Server-Sent Events: каждый результат отправляется один раз по готовности"""
+    async def events():
+        async for response in iter_task_results(task_ids, timeout):
+            yield f"event: result\ndata: {json.dumps(response, default=str)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @app.get("/health")
@@ -64,3 +156,72 @@ async def health_check():
         "status": "healthy",
         "services": ["fastapi", "celery", "redis", "postgresql"]
     }
+
+
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+
+@app.get("/metrics/hashing")
+async def hashing_metrics():
+    """Метрики пула хеширования паролей"""
+    return password_hasher.stats()
+
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Контроль допуска: текущие лимиты, очереди и отказы по классам маршрутов"""
+    return admission_stats()
+
+
+@app.get("/metrics/auth")
+async def auth_metrics():
+    """Ограничение попыток входа: пропущенные и отклоненные по имени и IP"""
+    return login_throttle.stats()
+
+
+@app.get("/metrics/tokens")
+async def token_metrics():
+    """Отзыв токенов: проверки, срабатывания фильтра, ротации и повторы refresh-токенов"""
+    return revocation_store.stats()
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Метрики внутрипроцессных кешей"""
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+
+@app.get("/metrics/tasks")
+async def task_metrics():
+    """Метрики публикации задач"""
+    return {**task_publisher.stats(), "dedup": dedup_stats()}
+
+
+@app.get("/metrics/results")
+async def result_metrics():
+    """Записанные результаты задач по типам: число, объем записи и средний размер"""
+    return await get_result_write_stats()
+
+
+@app.get("/metrics/db")
+async def db_metrics():
+    """Запросы к БД на HTTP-запрос, N+1 и медленные запросы"""
+    return db_stats()
+
+
+@app.get("/metrics/db/pool")
+async def db_pool_metrics():
+    """Пул соединений: выданные, переполнение, ожидание соединения"""
+    return get_pool_stats()
+
+
+@app.get("/metrics/db/replicas")
+async def db_replica_metrics():
+    """Реплики: отставание, доступность и распределение чтений"""
+    return replica_set.snapshot()
+
+
+@app.get("/metrics/queues")
+async def queue_metrics():
+    """Глубина очередей Celery и время ожидания задач"""
+    return await get_queue_stats()
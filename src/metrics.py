@@ -0,0 +1,185 @@
+"""Метрики Prometheus: задержки по шаблонам маршрутов, пулы потоков и соединений, bcrypt, публикация задач,
+контроль допуска.
+
+При нескольких процессах (uvicorn --workers, gunicorn) задайте PROMETHEUS_MULTIPROC_DIR до запуска:
+значения пишутся в mmap-файлы каталога, и /metrics суммирует их по всем процессам. Состояние пулов
+каждый процесс тогда записывает сам раз в METRICS_RUNTIME_INTERVAL секунд: опрос /metrics попадает
+только в один процесс.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import anyio.to_thread
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database import active_engine, async_engine, engine
+from src.db_pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+METRICS_RUNTIME_INTERVAL = float(os.environ.get("METRICS_RUNTIME_INTERVAL", "5"))
+
+# Фиксированные границы гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests in progress", ["method"],
+    multiprocess_mode="livesum",
+)
+THREADPOOL_IN_USE = Gauge(
+    "threadpool_in_use", "Busy threads of the default anyio thread pool",
+    multiprocess_mode="livesum",
+)
+THREADPOOL_LIMIT = Gauge(
+    "threadpool_limit", "Size of the default anyio thread pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "DB connections checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "DB connections opened over pool_size",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total", "DB connection checkouts"
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time including queueing",
+    buckets=LATENCY_BUCKETS,
+)
+TASK_PUBLISH_DURATION = Histogram(
+    "task_publish_duration_seconds", "Time to publish a task or canvas to the broker",
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_LIMIT = Gauge(
+    "admission_limit", "Current adaptive concurrency limit per route class", ["route_class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests waited for a concurrency slot", ["route_class"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed with 503 by admission control", ["route_class"]
+)
+LOGIN_THROTTLED = Counter(
+    "login_throttled_total", "Login attempts rejected before password verification", ["scope"]
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: число, задержка и статус запросов по шаблону маршрута (/users/{user_id})"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            REQUEST_DURATION.labels(method, route).observe(elapsed)
+            REQUESTS_TOTAL.labels(method, route, str(status_code)).inc()
+
+
+def _count_checkout(*args) -> None:
+    DB_POOL_CHECKOUTS.inc()
+
+
+def instrument_pools() -> None:
+    """Счетчик выдачи соединений из пулов синхронного и асинхронного движков"""
+    event.listen(engine.pool, "checkout", _count_checkout)
+    event.listen(async_engine.sync_engine.pool, "checkout", _count_checkout)
+
+
+def _collect_runtime() -> None:
+    """Текущее состояние пулов этого процесса на момент опроса"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+    THREADPOOL_LIMIT.set(limiter.total_tokens)
+    stats = pool_stats(active_engine().pool)
+    DB_POOL_CHECKED_OUT.set(stats.get("checked_out", 0))
+    DB_POOL_OVERFLOW.set(stats.get("overflow", 0))
+
+
+_runtime_task: Optional[asyncio.Task] = None
+
+
+async def _collect_runtime_forever() -> None:
+    while True:
+        try:
+            _collect_runtime()
+        except Exception as error:
+            logger.warning("Failed to collect runtime metrics: %s", error)
+        await asyncio.sleep(METRICS_RUNTIME_INTERVAL)
+
+
+async def start_runtime_metrics() -> None:
+    """В режиме нескольких процессов каждый процесс периодически обновляет свои gauge пулов"""
+    global _runtime_task
+    if MULTIPROCESS and _runtime_task is None:
+        _runtime_task = asyncio.create_task(_collect_runtime_forever())
+
+
+async def stop_runtime_metrics() -> None:
+    global _runtime_task
+    if _runtime_task is not None:
+        _runtime_task.cancel()
+        await asyncio.gather(_runtime_task, return_exceptions=True)
+        _runtime_task = None
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    _collect_runtime()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(data, media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    """Удалить live-метрики завершившегося процесса"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,39 @@
+import logging
+import time
+
+from celery.backends.redis import RedisBackend
+from celery.signals import before_task_publish, task_prerun
+
+logger = logging.getLogger(__name__)
+
+# Хеш Redis со временем ожидания задач в очередях (пишется воркерами)
+QUEUE_WAIT_KEY = 'queue-wait'
+# Заголовок сообщения с временем публикации
+PUBLISHED_AT_HEADER = 'published_at'
+
+
+@before_task_publish.connect
+def mark_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def record_queue_wait(sender=None, task=None, **kwargs):
+    """Время от публикации до начала выполнения по очередям"""
+    request = task.request
+    published_at = request.get(PUBLISHED_AT_HEADER)
+    backend = sender.backend
+    if published_at is None or request.is_eager or not isinstance(backend, RedisBackend):
+        return
+
+    queue = (request.delivery_info or {}).get('routing_key') or 'unknown'
+    wait = max(0.0, time.time() - float(published_at))
+    try:
+        with backend.client.pipeline() as pipe:
+            pipe.hincrbyfloat(QUEUE_WAIT_KEY, f'{queue}:seconds', wait)
+            pipe.hincrby(QUEUE_WAIT_KEY, f'{queue}:count', 1)
+            pipe.hset(QUEUE_WAIT_KEY, f'{queue}:last', wait)
+            pipe.execute()
+    except Exception:
+        logger.warning("Failed to record queue wait for task %s", request.id, exc_info=True)
@@ -0,0 +1,25 @@
+"""Общий асинхронный клиент Redis процесса: результаты задач, дедупликация, отзыв токенов,
+ограничение попыток входа. Не зависит от выбранного исполнителя задач."""
+import os
+from typing import Optional
+
+from redis.asyncio import Redis
+
+# Тот же Redis, что у Celery по умолчанию
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+_redis: Optional[Redis] = None
+
+
+def get_redis() -> Redis:
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(REDIS_URL)
+    return _redis
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,66 @@
+import logging
+import os
+import zlib
+
+import msgpack
+from celery.backends.redis import RedisBackend
+from celery.signals import task_postrun
+from kombu.serialization import register
+
+logger = logging.getLogger(__name__)
+
+# Компактный формат результатов: msgpack, сжатие zlib для значений больше порога
+COMPACT_SERIALIZER = 'compact'
+COMPRESS_THRESHOLD = int(os.getenv('RESULT_COMPRESS_THRESHOLD', '1024'))
+# Хеш Redis: сколько результатов и байт записано по типам задач. Счетчики только растут
+# (истечение и release не вычитаются), поэтому это объем записи, а не занятая память
+RESULT_WRITES_KEY = 'result-writes'
+
+_RAW = b'\x00'
+_ZLIB = b'\x01'
+
+
+def compact_dumps(obj) -> bytes:
+    data = msgpack.packb(obj, use_bin_type=True, default=str)
+    if len(data) > COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(data)
+    return _RAW + data
+
+
+def compact_loads(data: bytes):
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    marker, body = data[:1], data[1:]
+    if marker == _ZLIB:
+        body = zlib.decompress(body)
+    return msgpack.unpackb(body, raw=False)
+
+
+register(
+    COMPACT_SERIALIZER,
+    compact_dumps,
+    compact_loads,
+    content_type='application/x-compact-msgpack',
+    content_encoding='binary',
+)
+
+
+@task_postrun.connect
+def apply_result_policy(sender=None, task_id=None, **kwargs):
+    """Индивидуальный TTL результата (опция задачи result_ttl) и учет записанного объема по типам задач"""
+    backend = sender.backend
+    if sender.ignore_result or not isinstance(backend, RedisBackend):
+        return
+
+    key = backend.get_key_for_task(task_id)
+    try:
+        ttl = getattr(sender, 'result_ttl', None)
+        if ttl:
+            backend.expire(key, ttl)
+        size = backend.client.strlen(key)
+        with backend.client.pipeline() as pipe:
+            pipe.hincrby(RESULT_WRITES_KEY, f'{sender.name}:bytes_written', size)
+            pipe.hincrby(RESULT_WRITES_KEY, f'{sender.name}:results_written', 1)
+            pipe.execute()
+    except Exception:
+        logger.warning("Failed to apply result policy for task %s", task_id, exc_info=True)
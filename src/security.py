@@ -1,13 +1,24 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, List, Optional, NamedTuple
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from src.database import get_db
 from src.config import settings
+from src.cache import TTLCache
+from src.metrics import PASSWORD_HASH_DURATION
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -19,12 +30,140 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def get_password_hashes(passwords: List[str]) -> List[str]:
+    """Хеширование пачки паролей за одну задачу пула (массовый импорт)"""
+    return [pwd_context.hash(password) for password in passwords]
+
+
+class PasswordHasher:
+    """Ограниченный пул для bcrypt с очередью фиксированной длины и метриками"""
+
+    def __init__(self, kind: str, workers: int, queue_size: int):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix="bcrypt"
+                        )
+        return self._executor
+
+    def _admit(self) -> None:
+        """Занять место в очереди пула; при переполненной очереди сразу отдать 503"""
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, try again later",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+
+    def _done(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        PASSWORD_HASH_DURATION.observe(elapsed)
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def run(self, func, *args):
+        """Выполнить func в пуле; при переполненной очереди сразу отдать 503"""
+        self._admit()
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._done(started)
+
+    def run_blocking(self, func, *args):
+        """То же для синхронного кода (сервисы при DB_ASYNC=false): поток ждет результат из пула"""
+        self._admit()
+        started = time.perf_counter()
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._done(started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_latency_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+                "max_latency_ms": round(self.max_seconds * 1000, 2),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_EXECUTOR,
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_QUEUE_SIZE,
+)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+def get_password_hash_pooled(password: str) -> str:
+    return password_hasher.run_blocking(get_password_hash, password)
+
+def verify_password_pooled(plain_password: str, hashed_password: str) -> bool:
+    return password_hasher.run_blocking(verify_password, plain_password, hashed_password)
+
+class CurrentUser(NamedTuple):
+    """Неизменяемый снимок аутентифицированного пользователя"""
+    id: int
+    username: str
+    role: str
+    is_approved: bool
+
+
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(user_id: int) -> None:
+    user_cache.pop(user_id)
+
+def new_token_id() -> str:
+    """Идентификатор токена (jti) или семейства refresh-токенов (fam)"""
+    return uuid.uuid4().hex
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    to_encode.setdefault("jti", new_token_id())
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire  = datetime.utcnow() + timedelta(settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire  = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
@@ -32,20 +171,58 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def create_refresh_token(data: dict) -> str:
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode = data.copy()
+    to_encode.setdefault("jti", new_token_id())
     to_encode.update({"exp": expire, "type": "refresh"})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-def verify_token(token: str, credentials_exception) -> Optional[dict]:
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
-        return payload
-    except JWTError:
+# Кеш проверенных JWT: ключ - sha256 токена, значение - claims
+token_cache = TTLCache(settings.JWT_CACHE_SIZE, settings.JWT_CACHE_TTL_SECONDS)
+
+# Проверки отзыва токена: функция получает claims и возвращает True, если токен отозван
+revocation_checks: List[Callable[[dict], bool]] = []
+
+def register_revocation_check(check: Callable[[dict], bool]) -> None:
+    revocation_checks.append(check)
+
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _is_revoked(payload: dict) -> bool:
+    return any(check(payload) for check in revocation_checks)
+
+def evict_cached_token(token: str) -> None:
+    token_cache.pop(_token_key(token))
+
+def decode_token(token: str) -> Optional[dict]:
+    """Проверить подпись и срок действия токена; проверенные claims кешируются до exp"""
+    key = _token_key(token)
+    now = time.time()
+    payload = token_cache.get(key)
+    if payload is None or payload.get("exp", 0) <= now:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+        except JWTError:
+            return None
+        exp = payload.get("exp")
+        if exp is not None:
+            token_cache.set(key, payload, ttl=min(exp - now, settings.JWT_CACHE_TTL_SECONDS))
+
+    if _is_revoked(payload):
+        return None
+    return dict(payload)
+
+def verify_token(token: str, credentials_exception: Optional[HTTPException] = None) -> Optional[dict]:
+    payload = decode_token(token)
+    if payload is None and credentials_exception is not None:
         raise credentials_exception
+    return payload
 
 
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)  # get_db из database.py
+        # Основная БД, не реплика: пользователь кешируется в user_cache, и снимок отстающей
+        # реплики пережил бы смену роли или блокировку
+        db: Session = Depends(get_db)
 ):
     """Получает текущего пользователя из токена"""
     from src.users.models import User  # Импорт здесь чтобы избежать circular imports
@@ -56,7 +233,7 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    payload = verify_token(token)
+    payload = verify_token(token, credentials_exception)
     if payload is None:
         raise credentials_exception
 
@@ -64,9 +241,25 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user_id = int(user_id)
+    current_user = user_cache.get(user_id)
+    if current_user is not None:
+        return current_user
+
+    if isinstance(db, AsyncSession):
+        user = await db.get(User, user_id)
+    else:
+        user = await run_in_threadpool(db.get, User, user_id)
     if user is None:
         raise credentials_exception
 
-    return user
+    current_user = CurrentUser(
+        id=user.id,
+        username=user.username,
+        role=getattr(user.role, "value", user.role),
+        is_approved=user.is_approved,
+    )
+    user_cache.set(user_id, current_user)
+    return current_user
+
 
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+from typing import Optional
+
+from celery import Task, states
+from celery.utils import uuid
+
+from src.celery_app import celery_app
+from src.task_queue import LOCAL_TASKS, task_publisher
+from src.redis_client import get_redis
+from src.task_results import RELEASED_FIELD, get_task_results
+
+# Ключи Redis: хеш имени задачи и аргументов -> id задачи, которая их обрабатывает
+DEDUP_KEY_PREFIX = 'task-dedup:'
+# Попыток занять ключ, если он истекает между SET NX и GET
+MAX_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_stats = {"submitted": 0, "in_flight_hits": 0, "cached_hits": 0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] += 1
+
+
+def dedup_stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def task_fingerprint(task: Task, args: tuple, kwargs: dict) -> str:
+    """Хеш имени задачи и аргументов в каноническом виде"""
+    payload = json.dumps([task.name, args, kwargs], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _dedup_ttl(task: Task) -> int:
+    # Запись не должна жить дольше результата, на который она ссылается
+    result_ttl = getattr(task, 'result_ttl', None) or celery_app.conf.result_expires
+    ttl = getattr(task, 'dedup_ttl', None) or result_ttl
+    return int(min(ttl, result_ttl))
+
+
+async def _claim(key: str, task_id: str, ttl: int) -> bool:
+    if LOCAL_TASKS:
+        return task_publisher.claim(key, task_id, ttl)
+    return bool(await get_redis().set(key, task_id, nx=True, ex=ttl))
+
+
+async def _get_claim(key: str) -> Optional[str]:
+    if LOCAL_TASKS:
+        return task_publisher.get_claim(key)
+    existing = await get_redis().get(key)
+    return None if existing is None else existing.decode()
+
+
+async def _drop_claim(key: str) -> None:
+    if LOCAL_TASKS:
+        task_publisher.drop_claim(key)
+    else:
+        await get_redis().delete(key)
+
+
+async def submit_task(task: Task, *args, **kwargs) -> dict:
+    """Поставить задачу в очередь; для задач с idempotent=True вернуть уже запущенную или готовую"""
+    if not getattr(task, 'idempotent', False):
+        task_id = await task_publisher.enqueue(task, *args, **kwargs)
+        return {"task_id": task_id, "message": "Task started"}
+
+    key = DEDUP_KEY_PREFIX + task_fingerprint(task, args, kwargs)
+    ttl = _dedup_ttl(task)
+
+    for _ in range(MAX_ATTEMPTS):
+        new_task_id = uuid()
+        if await _claim(key, new_task_id, ttl):
+            try:
+                await task_publisher.publish(task, args, kwargs, task_id=new_task_id)
+            except Exception:
+                await _drop_claim(key)
+                raise
+            _count("submitted")
+            return {"task_id": new_task_id, "message": "Task started"}
+
+        existing = await _get_claim(key)
+        if existing is None:
+            continue
+        response = (await get_task_results([existing]))[0]
+        if response["status"] in states.PROPAGATE_STATES or response.get(RELEASED_FIELD):
+            # Ошибки и результаты без крупных полей (release=true) не кешируем:
+            # освобождаем ключ и запускаем задачу заново
+            await _drop_claim(key)
+            continue
+        if response["ready"]:
+            _count("cached_hits")
+            return {**response, "message": "Result from cache"}
+        _count("in_flight_hits")
+        return {"task_id": response["task_id"], "message": "Task already in progress"}
+
+    task_id = await task_publisher.enqueue(task, *args, **kwargs)
+    return {"task_id": task_id, "message": "Task started"}
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from celery import Signature, Task
+from celery.utils import uuid
+from fastapi import HTTPException, status
+
+from src.celery_app import celery_app
+from src.database import WEB_CONCURRENCY
+from src.config import settings
+from src.local_executor import LocalTaskExecutor
+from src.metrics import TASK_PUBLISH_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class TaskPublisher:
+    """Неблокирующая постановка задач: публикация в пуле потоков через прогретый пул продюсеров"""
+
+    def __init__(self, workers: int, batch_window_ms: float, max_batch: int):
+        self.workers = max(1, workers)
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="celery-publish")
+        self._batch: List[Tuple[Task, tuple, dict, str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.batches = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+
+    def _publish_batch(self, batch: List[Tuple[Task, tuple, dict, str]]) -> None:
+        """Публикация пачки сообщений на одном соединении из пула"""
+        started = time.perf_counter()
+        with celery_app.producer_or_acquire() as producer:
+            for task, args, kwargs, task_id in batch:
+                task.apply_async(args, kwargs, task_id=task_id, producer=producer)
+        elapsed = time.perf_counter() - started
+        TASK_PUBLISH_DURATION.observe(elapsed)
+        with self._lock:
+            self.published += len(batch)
+            self.batches += 1
+            self.total_seconds += elapsed
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, self._publish_batch, [item[:4] for item in batch]
+        )
+
+        def resolve(done: asyncio.Future) -> None:
+            error = done.exception()
+            for *_, waiter in batch:
+                if waiter.done():
+                    continue
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+
+        future.add_done_callback(resolve)
+
+    async def enqueue(self, task: Task, *args, **kwargs) -> str:
+        """Поставить задачу в очередь и вернуть ее id, не блокируя event loop"""
+        return await self.publish(task, args, kwargs)
+
+    async def publish(self, task: Task, args: tuple, kwargs: dict, task_id: Optional[str] = None) -> str:
+        """То же, что enqueue, с явными args/kwargs и заранее выбранным id"""
+        task_id = task_id or uuid()
+        loop = asyncio.get_running_loop()
+        try:
+            if self.batch_window <= 0:
+                await loop.run_in_executor(
+                    self._executor, self._publish_batch, [(task, args, kwargs, task_id)]
+                )
+            else:
+                waiter = loop.create_future()
+                self._batch.append((task, args, kwargs, task_id, waiter))
+                if len(self._batch) >= self.max_batch:
+                    self._flush()
+                elif self._flush_handle is None:
+                    self._flush_handle = loop.call_later(self.batch_window, self._flush)
+                await waiter
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            logger.exception("Failed to publish task %s", task.name)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Task queue is unavailable",
+            )
+        return task_id
+
+    def _apply_signature(self, signature: Signature) -> None:
+        started = time.perf_counter()
+        with celery_app.producer_or_acquire() as producer:
+            signature.apply_async(producer=producer)
+        elapsed = time.perf_counter() - started
+        TASK_PUBLISH_DURATION.observe(elapsed)
+        with self._lock:
+            self.published += 1
+            self.batches += 1
+            self.total_seconds += elapsed
+
+    async def publish_signature(self, signature: Signature) -> None:
+        """Публикация canvas (group/chord) в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._apply_signature, signature)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            logger.exception("Failed to publish canvas %s", signature)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Task queue is unavailable",
+            )
+
+    def warm_up(self) -> None:
+        """Открыть соединения с брокером заранее, до первого запроса"""
+        for _ in range(self.workers):
+            self._executor.submit(self._connect)
+
+    @staticmethod
+    def _connect() -> None:
+        try:
+            with celery_app.producer_or_acquire() as producer:
+                producer.connection.ensure_connection(max_retries=1)
+        except Exception:
+            logger.warning("Broker is not reachable, connection will be opened on first publish")
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "celery",
+                "published": self.published,
+                "batches": self.batches,
+                "failed": self.failed,
+                "pending_batch": len(self._batch),
+                "avg_publish_ms": round(self.total_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            }
+
+
+LOCAL_TASKS = settings.TASK_BACKEND == "local"
+if LOCAL_TASKS and WEB_CONCURRENCY > 1:
+    # Результаты и дедупликация живут в памяти процесса: другой воркер
+    # не нашел бы задачу, поставленную этим
+    raise RuntimeError("TASK_BACKEND=local requires a single process, set WEB_CONCURRENCY=1 or use celery")
+
+task_publisher = LocalTaskExecutor(settings.LOCAL_TASK_WORKERS) if LOCAL_TASKS else TaskPublisher(
+    settings.TASK_PUBLISH_WORKERS,
+    settings.TASK_PUBLISH_BATCH_MS,
+    settings.TASK_PUBLISH_MAX_BATCH,
+)
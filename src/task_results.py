@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from celery import states
+
+from src.celery_app import celery_app, PRIORITY_SEP, PRIORITY_STEPS
+from src.queue_metrics import QUEUE_WAIT_KEY
+from src.redis_client import get_redis
+from src.task_queue import LOCAL_TASKS, task_publisher
+from src.result_storage import RESULT_WRITES_KEY
+
+# Поля результата крупнее этого размера удаляются после того, как клиент получил результат
+RESULT_TRIM_BYTES = int(os.getenv('RESULT_TRIM_BYTES', '256'))
+# Отметка в сохраненном результате, что крупные поля уже удалены
+RELEASED_FIELD = 'released'
+
+def _task_key(task_id: str) -> bytes:
+    return celery_app.backend.get_key_for_task(task_id)
+
+
+def _to_response(task_id: str, payload: Optional[bytes]) -> dict:
+    """Ответ в формате /task/{task_id} из сохраненного бэкендом значения"""
+    return _meta_to_response(task_id, None if payload is None else celery_app.backend.decode(payload))
+
+
+def _meta_to_response(task_id: str, meta: Optional[dict]) -> dict:
+    if meta is None:
+        status = states.PENDING
+        result = None
+    else:
+        status = meta["status"]
+        result = meta["result"] if status == states.SUCCESS else None
+    response = {
+        "task_id": task_id,
+        "status": status,
+        "result": result,
+        "ready": status in states.READY_STATES,
+    }
+    if meta is not None and meta.get(RELEASED_FIELD):
+        # Крупные поля удалены release=true: результат неполный
+        response[RELEASED_FIELD] = True
+    return response
+
+
+async def get_task_results(task_ids: List[str]) -> List[dict]:
+    """Статусы нескольких задач одним MGET"""
+    if not task_ids:
+        return []
+    if LOCAL_TASKS:
+        return [_meta_to_response(task_id, task_publisher.get_meta(task_id)) for task_id in task_ids]
+    payloads = await get_redis().mget([_task_key(task_id) for task_id in task_ids])
+    return [_to_response(task_id, payload) for task_id, payload in zip(task_ids, payloads)]
+
+
+async def release_task_result(task_id: str) -> None:
+    """Удалить крупные поля сохраненного результата, сохранив его TTL"""
+    backend = celery_app.backend
+    if LOCAL_TASKS:
+        meta = task_publisher.get_meta(task_id)
+    else:
+        client = get_redis()
+        key = _task_key(task_id)
+        payload = await client.get(key)
+        meta = None if payload is None else backend.decode(payload)
+    if meta is None:
+        return
+
+    result = meta.get("result")
+    if meta["status"] != states.SUCCESS or not isinstance(result, dict):
+        return
+
+    trimmed = {
+        field: value for field, value in result.items()
+        if len(backend.encode(value)) <= RESULT_TRIM_BYTES
+    }
+    if len(trimmed) < len(result):
+        meta = {**meta, "result": trimmed, RELEASED_FIELD: True}
+        if LOCAL_TASKS:
+            task_publisher.set_meta(task_id, meta)
+        else:
+            await client.set(key, backend.encode(meta), keepttl=True)
+
+
+async def get_result_write_stats() -> Dict[str, dict]:
+    """Записанные результаты по типам задач: число, байты и средний размер (пишется воркерами)"""
+    if LOCAL_TASKS:
+        return task_publisher.result_stats()
+    raw = await get_redis().hgetall(RESULT_WRITES_KEY)
+    stats: Dict[str, dict] = {}
+    for field, value in raw.items():
+        name, _, metric = field.decode().rpartition(":")
+        stats.setdefault(name, {"results_written": 0, "bytes_written": 0})[metric] = int(value)
+    for item in stats.values():
+        count = item["results_written"]
+        item["avg_bytes"] = item["bytes_written"] // count if count else 0
+    return stats
+
+
+def _priority_keys(queue: str) -> List[str]:
+    # Так же, как транспорт Redis раскладывает сообщения по спискам приоритетов
+    return [f"{queue}{PRIORITY_SEP}{pri}" if pri else queue for pri in PRIORITY_STEPS]
+
+
+async def get_queue_stats() -> Dict[str, dict]:
+    """Глубина очередей и время ожидания задач до начала выполнения"""
+    if LOCAL_TASKS:
+        return task_publisher.queue_stats()
+    client = get_redis()
+    queues = [queue.name for queue in celery_app.conf.task_queues]
+    async with client.pipeline(transaction=False) as pipe:
+        for queue in queues:
+            for key in _priority_keys(queue):
+                pipe.llen(key)
+        pipe.hgetall(QUEUE_WAIT_KEY)
+        *lengths, raw_wait = await pipe.execute()
+
+    steps = len(PRIORITY_STEPS)
+    stats: Dict[str, dict] = {
+        queue: {"depth": sum(lengths[i * steps:(i + 1) * steps])}
+        for i, queue in enumerate(queues)
+    }
+    wait: Dict[str, dict] = {}
+    for field, value in raw_wait.items():
+        name, _, metric = field.decode().rpartition(":")
+        wait.setdefault(name, {})[metric] = float(value)
+    for name, item in wait.items():
+        count = int(item.get("count", 0))
+        stats.setdefault(name, {"depth": 0}).update({
+            "started": count,
+            "avg_wait_ms": round(item.get("seconds", 0) / count * 1000, 2) if count else 0.0,
+            "last_wait_ms": round(item.get("last", 0) * 1000, 2),
+        })
+    return stats
+
+
+async def iter_task_results(task_ids: List[str], timeout: float) -> AsyncIterator[dict]:
+    """Отдает результат каждой задачи один раз по мере готовности (pub/sub бэкенда)"""
+    if LOCAL_TASKS:
+        async for response in _iter_local_results(task_ids, timeout):
+            yield response
+        return
+
+    channels: Dict[bytes, str] = {_task_key(task_id): task_id for task_id in dict.fromkeys(task_ids)}
+    pubsub = get_redis().pubsub()
+    try:
+        # Подписка до MGET, чтобы не пропустить результат, записанный между ними
+        await pubsub.subscribe(*channels)
+        pending = set(channels.values())
+        for response in await get_task_results(list(pending)):
+            if response["ready"]:
+                pending.discard(response["task_id"])
+                yield response
+
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is None or message["type"] != "message":
+                continue
+            task_id = channels.get(message["channel"])
+            if task_id not in pending:
+                continue
+            response = _to_response(task_id, message["data"])
+            if response["ready"]:
+                pending.discard(task_id)
+                yield response
+    finally:
+        await pubsub.aclose()
+
+
+async def _iter_local_results(task_ids: List[str], timeout: float) -> AsyncIterator[dict]:
+    """То же для локального исполнителя: ожидание завершения задач в пуле процессов"""
+    pending: Dict[asyncio.Future, str] = {}
+    for task_id in dict.fromkeys(task_ids):
+        completion = task_publisher.completion(task_id)
+        if completion is None:
+            response = (await get_task_results([task_id]))[0]
+            if response["ready"]:
+                yield response
+        else:
+            pending[completion] = task_id
+
+    deadline = time.monotonic() + timeout
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await asyncio.wait(list(pending), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for future in [future for future in pending if future.done()]:
+            yield (await get_task_results([pending.pop(future)]))[0]
+
+
+async def wait_for_task_result(task_id: str, timeout: float) -> dict:
+    """Long-poll: результат задачи или текущий статус по истечении timeout"""
+    async for response in iter_task_results([task_id], timeout):
+        return response
+    return (await get_task_results([task_id]))[0]
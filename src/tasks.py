@@ -1,19 +1,49 @@
+from typing import List
+
 from .celery_app import celery_app
 import time
 
-@celery_app.task
+
+def _process_text(text: str, keep_original: bool = True) -> dict:
+    result = {
+        'length': len(text),
+        'uppercase': text.upper(),
+        'processed_at': time.time()
+    }
+    if keep_original:
+        result['original'] = text
+    return result
+
+@celery_app.task(result_ttl=3600, idempotent=True, acks_late=True)
 def add_numbers(a: int, b: int) -> int:
     """Простая задача сложения чисел"""
     time.sleep(5)  # Имитация долгой операции
     return a + b
 
-@celery_app.task
+@celery_app.task(result_ttl=600, idempotent=True, priority=2)
 def process_text(text: str) -> dict:
     """Обработка текста"""
     time.sleep(3)
+    return _process_text(text)
+
+@celery_app.task(result_ttl=600)
+def process_text_batch(texts: List[str], keep_original: bool = True) -> List[dict]:
+    """Обработка пачки текстов одной задачей"""
+    return [_process_text(text, keep_original) for text in texts]
+
+@celery_app.task(result_ttl=600, priority=0)
+def merge_text_results(chunks: List[List[dict]], document: bool = False) -> dict:
+    """Объединение результатов пачек; для документа части склеиваются в один текст"""
+    items = [item for chunk in chunks for item in chunk]
+    if document:
+        return {
+            'length': sum(item['length'] for item in items),
+            'uppercase': ''.join(item['uppercase'] for item in items),
+            'chunks': len(items),
+            'processed_at': time.time()
+        }
     return {
-        'original': text,
-        'length': len(text),
-        'uppercase': text.upper(),
-        'processed_at': time.time()
-    }
\ No newline at end of file
+        'count': len(items),
+        'total_length': sum(item['length'] for item in items),
+        'results': items
+    }
@@ -0,0 +1,66 @@
+import codecs
+from typing import AsyncIterator, List
+
+from celery import chord
+from celery.utils import uuid
+from fastapi import HTTPException, status
+
+from src.task_queue import task_publisher
+from src.tasks import process_text_batch, merge_text_results
+
+# Текстов в одной задаче: накладные расходы брокера и бэкенда делятся на всю пачку
+TEXT_BATCH_SIZE = 100
+# Размер части документа в символах
+DOCUMENT_CHUNK_CHARS = 64 * 1024
+# Ограничение размера документа в теле запроса
+MAX_DOCUMENT_BYTES = 10 * 1024 * 1024
+
+
+def _batches(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def split_document(stream: AsyncIterator[bytes]) -> List[str]:
+    """Читает тело запроса потоком и режет текст на части по границе пробела"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks: List[str] = []
+    buffer = ""
+    received = 0
+    async for data in stream:
+        received += len(data)
+        if received > MAX_DOCUMENT_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Document is too large",
+            )
+        try:
+            buffer += decoder.decode(data)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Document must be UTF-8 text")
+        while len(buffer) >= DOCUMENT_CHUNK_CHARS:
+            cut = buffer.rfind(" ", 0, DOCUMENT_CHUNK_CHARS) + 1 or DOCUMENT_CHUNK_CHARS
+            chunks.append(buffer[:cut])
+            buffer = buffer[cut:]
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        chunks.append(buffer)
+    return chunks
+
+
+async def submit_text_batch(texts: List[str], document: bool = False) -> dict:
+    """Разбить тексты на пачки, запустить их группой и объединить результаты в chord"""
+    chunk_ids = []
+    header = []
+    for batch in _batches(texts, TEXT_BATCH_SIZE):
+        chunk_id = uuid()
+        chunk_ids.append(chunk_id)
+        header.append(process_text_batch.s(batch, keep_original=not document).set(task_id=chunk_id))
+
+    task_id = uuid()
+    callback = merge_text_results.s(document=document).set(task_id=task_id)
+    await task_publisher.publish_signature(chord(header, callback))
+    return {
+        "task_id": task_id,
+        "chunk_task_ids": chunk_ids,
+        "message": "Text processing started"
+    }
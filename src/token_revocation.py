@@ -0,0 +1,289 @@
+"""Отзыв JWT и ротация refresh-токенов.
+
+Каждый токен получает jti, токены одного входа - общий идентификатор семейства (fam). Выход
+отзывает jti и все семейство; refresh-токен действует один раз, повторное предъявление уже
+обмененного токена считается кражей и отзывает семейство.
+
+Источник истины - Redis: отозванные идентификаторы с TTL до истечения токенов и текущий jti
+каждого семейства. Проверка на каждом запросе не делает I/O: в процессе хранится фильтр Блума
+отозванных идентификаторов (большинство токенов не отозвано, и фильтр отвечает "точно нет" за
+несколько проверок битов) и точная карта для подтверждения срабатываний фильтра. Отзывы других
+процессов приходят через pub/sub; периодическая полная синхронизация восстанавливает пропущенные
+сообщения и пересобирает фильтр без истекших записей. С TOKEN_REVOCATION_BACKEND=local Redis не
+используется, и отзывы действуют только в этом процессе.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Dict
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from src.cache import TTLCache
+from src.config import settings
+from src.database import WEB_CONCURRENCY
+from src.redis_client import get_redis
+from src.security import register_revocation_check
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY_PREFIX = "token-revoked:"
+FAMILY_KEY_PREFIX = "token-family:"
+REVOCATION_CHANNEL = "token-revocations"
+RESUBSCRIBE_DELAY = 1.0
+
+LOCAL_REVOCATION = settings.TOKEN_REVOCATION_BACKEND == "local"
+if LOCAL_REVOCATION and WEB_CONCURRENCY > 1:
+    # Выход, обработанный одним воркером, не отозвал бы токен в остальных
+    raise RuntimeError("TOKEN_REVOCATION_BACKEND=local requires a single process, set WEB_CONCURRENCY=1 or use redis")
+
+# KEYS: текущий jti семейства, отметка отзыва семейства; ARGV: предъявленный jti, новый jti, TTL.
+# 1 - ротация выполнена, 0 - семейство отозвано, -1 - предъявлен уже обмененный токен.
+ROTATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[1] then
+    return -1
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def _refresh_lifetime() -> int:
+    return settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+
+
+class BloomFilter:
+    """Фильтр Блума: ложноположительные ответы с вероятностью error_rate, ложноотрицательных нет"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @staticmethod
+    def _hashes(item: str):
+        # Двойное хеширование: k позиций из двух 32-битных половин SipHash строки. Соль hash()
+        # своя у каждого процесса, но фильтр строится и читается только в своем процессе.
+        value = hash(item) & 0xFFFFFFFFFFFFFFFF
+        return value & 0xFFFFFFFF, (value >> 32) | 1
+
+    def add(self, item: str) -> None:
+        first, second = self._hashes(item)
+        for i in range(self.hashes):
+            position = (first + i * second) % self.size
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        first, second = self._hashes(item)
+        bits, size = self._bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            # Для неотозванного токена обычно хватает одной-двух проверок
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class TokenRevocationStore:
+    """Отозванные jti и семейства: Redis + фильтр Блума и точная карта в процессе"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # "jti:<id>" / "fam:<id>" -> время истечения отзыва (epoch)
+        self._revoked: Dict[str, float] = {}
+        self._filter = self._new_filter(0)
+        # Текущий jti семейства для TOKEN_REVOCATION_BACKEND=local
+        self._families = TTLCache(maxsize=settings.TOKEN_FAMILY_LOCAL_SIZE, ttl=_refresh_lifetime())
+        self._rotate_script = None
+        self._tasks = []
+        self._stats = {"filter_hits": 0, "false_positives": 0, "revoked_hits": 0,
+                       "revocations": 0, "rotations": 0, "reuse_detected": 0, "synced": 0}
+
+    @staticmethod
+    def _new_filter(count: int) -> BloomFilter:
+        # Запас по емкости: при переполнении доля ложных срабатываний быстро растет
+        return BloomFilter(max(settings.REVOCATION_FILTER_CAPACITY, count * 2), settings.REVOCATION_FILTER_ERROR_RATE)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    # --- проверка на каждом запросе ---
+
+    def _matches(self, item: str, now: float) -> bool:
+        if item not in self._filter:
+            return False
+        self._count("filter_hits")
+        expires_at = self._revoked.get(item)
+        if expires_at is None or expires_at <= now:
+            self._count("false_positives")
+            return False
+        return True
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Проверка для security.decode_token: только память процесса, без блокировок в частом случае"""
+        now = time.time()
+        jti, family = payload.get("jti"), payload.get("fam")
+        revoked = (jti is not None and self._matches("jti:" + jti, now)) or \
+                  (family is not None and self._matches("fam:" + family, now))
+        if revoked:
+            self._count("revoked_hits")
+        return revoked
+
+    # --- изменения ---
+
+    def _apply(self, item: str, expires_at: float) -> None:
+        with self._lock:
+            if expires_at > self._revoked.get(item, 0):
+                self._revoked[item] = expires_at
+            self._filter.add(item)
+
+    async def _revoke(self, item: str, expires_at: float) -> None:
+        self._apply(item, expires_at)
+        self._count("revocations")
+        if LOCAL_REVOCATION:
+            return
+        ttl = math.ceil(expires_at - time.time())
+        if ttl <= 0:
+            return
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.set(REVOKED_KEY_PREFIX + item, repr(expires_at), ex=ttl)
+                pipe.publish(REVOCATION_CHANNEL, f"{item} {expires_at!r}")
+                await pipe.execute()
+        except RedisError as error:
+            logger.error("Failed to store token revocation %s: %s", item, error)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Token revocation is temporarily unavailable",
+            )
+
+    async def revoke_session(self, payload: dict) -> None:
+        """Выход: отозвать токен и все токены его семейства"""
+        if payload.get("jti") is not None and payload.get("exp") is not None:
+            await self._revoke(f"jti:{payload['jti']}", float(payload["exp"]))
+        if payload.get("fam") is not None:
+            await self._revoke(f"fam:{payload['fam']}", time.time() + _refresh_lifetime())
+
+    async def rotate(self, payload: dict, new_jti: str) -> None:
+        """Обменять refresh-токен: предъявленный jti должен быть текущим jti семейства"""
+        jti, family = payload.get("jti"), payload.get("fam")
+        if jti is None or family is None:
+            # Токены без jti/fam выпущены до ротации: обменять их безопасно нельзя
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+        if LOCAL_REVOCATION:
+            with self._lock:
+                current = self._families.get(family)
+                result = -1 if current is not None and current != jti else 1
+                if result == 1:
+                    self._families.set(family, new_jti)
+        else:
+            if self._rotate_script is None:
+                self._rotate_script = get_redis().register_script(ROTATE_SCRIPT)
+            result = await self._rotate_script(
+                keys=[FAMILY_KEY_PREFIX + family, f"{REVOKED_KEY_PREFIX}fam:{family}"],
+                args=[jti, new_jti, _refresh_lifetime()],
+                client=get_redis(),
+            )
+
+        if result == 1:
+            self._count("rotations")
+            return
+        if result == -1:
+            self._count("reuse_detected")
+            logger.warning("Refresh token reuse detected for family %s, revoking the family", family)
+            await self._revoke(f"fam:{family}", time.time() + _refresh_lifetime())
+            raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+        self._apply(f"fam:{family}", time.time() + _refresh_lifetime())
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    # --- синхронизация процессов ---
+
+    async def sync(self) -> None:
+        """Полная загрузка отзывов из Redis и пересборка фильтра без истекших записей"""
+        client = get_redis()
+        loaded: Dict[str, float] = {}
+        async for key in client.scan_iter(match=REVOKED_KEY_PREFIX + "*", count=1000):
+            value = await client.get(key)
+            if value is not None:
+                loaded[key.decode()[len(REVOKED_KEY_PREFIX):]] = float(value)
+        self._rebuild(loaded)
+        self._count("synced")
+
+    def _rebuild(self, loaded: Dict[str, float]) -> None:
+        now = time.time()
+        with self._lock:
+            # Локальные отзывы сохраняются: они могли появиться во время загрузки
+            merged = {item: expires_at for item, expires_at in self._revoked.items() if expires_at > now}
+            for item, expires_at in loaded.items():
+                if expires_at > max(now, merged.get(item, 0)):
+                    merged[item] = expires_at
+            bloom = self._new_filter(len(merged))
+            for item in merged:
+                bloom.add(item)
+            self._revoked, self._filter = merged, bloom
+
+    def _on_message(self, data: bytes) -> None:
+        item, _, expires_at = data.decode().partition(" ")
+        self._apply(item, float(expires_at))
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                # Подписка до загрузки, чтобы не пропустить отзыв между ними
+                await pubsub.subscribe(REVOCATION_CHANNEL)
+                await self.sync()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                    if message is not None and message["type"] == "message":
+                        self._on_message(message["data"])
+            except RedisError as error:
+                logger.warning("Token revocation subscription lost: %s", error)
+                await asyncio.sleep(RESUBSCRIBE_DELAY)
+            finally:
+                await pubsub.aclose()
+
+    async def _resync_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_RESYNC_SECONDS)
+            try:
+                if LOCAL_REVOCATION:
+                    self._rebuild({})
+                else:
+                    await self.sync()
+            except RedisError as error:
+                logger.warning("Token revocation resync failed: %s", error)
+
+    async def start(self) -> None:
+        if not LOCAL_REVOCATION:
+            self._tasks.append(asyncio.create_task(self._listen()))
+        self._tasks.append(asyncio.create_task(self._resync_forever()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "revoked": len(self._revoked),
+                "filter_bits": self._filter.size,
+                "filter_hashes": self._filter.hashes,
+            }
+
+
+revocation_store = TokenRevocationStore()
+register_revocation_check(revocation_store.is_revoked)
@@ -0,0 +1,149 @@
+import asyncio
+import csv
+import io
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from src.security import password_hasher, get_password_hashes
+from src.users.schemas import UserImportError, UserImportReport
+from src.users.services import integrity_error_detail
+
+if TYPE_CHECKING:
+    from src.auth.schemas import UserCreate
+
+# Паролей в одной задаче пула хеширования: задача импорта занимает воркер не дольше пары bcrypt,
+# и входы пользователей ждут в общей очереди недолго
+HASH_CHUNK_SIZE = 2
+# Строк в одном многострочном INSERT и в одном запросе проверки дубликатов
+INSERT_CHUNK_SIZE = 1000
+
+
+def parse_rows(body: bytes, content_type: str) -> List[Optional[Dict[str, Any]]]:
+    """Разбор CSV (с заголовком) или NDJSON в список словарей; None - нечитаемая строка"""
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    if "csv" in content_type:
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        rows.append(row if isinstance(row, dict) else None)
+    return rows
+
+
+def _validate(rows: List[Optional[Dict[str, Any]]]) -> Tuple[List[Tuple[int, "UserCreate"]], List[UserImportError]]:
+    """Валидация строк и поиск дубликатов внутри файла"""
+    # Импорт здесь: src.auth при загрузке импортирует src.users, и на уровне модуля получился бы цикл
+    from src.auth.schemas import UserCreate
+
+    valid = []
+    errors = []
+    seen_usernames = set()
+    seen_emails = set()
+    for number, row in enumerate(rows, start=1):
+        if row is None:
+            errors.append(UserImportError(row=number, error="Invalid JSON object"))
+            continue
+        try:
+            user = UserCreate.model_validate({k: v for k, v in row.items() if v not in (None, "")})
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            errors.append(UserImportError(row=number, error=f"{field}: {error['msg']}"))
+            continue
+
+        if user.username in seen_usernames:
+            errors.append(UserImportError(row=number, error="Username duplicated in file"))
+            continue
+        if user.email in seen_emails:
+            errors.append(UserImportError(row=number, error="Email duplicated in file"))
+            continue
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+        valid.append((number, user))
+    return valid, errors
+
+
+async def _hash_passwords(passwords: List[str]) -> List[str]:
+    """Параллельное хеширование пачками не более чем на workers задачах пула"""
+    semaphore = asyncio.Semaphore(password_hasher.workers)
+
+    async def hash_chunk(chunk: List[str]) -> List[str]:
+        async with semaphore:
+            return await password_hasher.run(get_password_hashes, chunk)
+
+    chunks = [passwords[i:i + HASH_CHUNK_SIZE] for i in range(0, len(passwords), HASH_CHUNK_SIZE)]
+    hashed = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+    return [password for chunk in hashed for password in chunk]
+
+
+async def _insert_rows_one_by_one(db, service, chunk, rows: List[Dict[str, Any]], errors: List[UserImportError]) -> int:
+    """Вставка строк пачки по одной; вернуть число вставленных, ошибки дописать в errors"""
+    created = 0
+    for (number, _), row in zip(chunk, rows):
+        try:
+            await service.bulk_insert_users(db, [row])
+            created += 1
+        except IntegrityError as e:
+            errors.append(UserImportError(row=number, error=integrity_error_detail(e)))
+        except SQLAlchemyError:
+            errors.append(UserImportError(row=number, error="Database error occurred"))
+    return created
+
+
+async def import_users(db, service, body: bytes, content_type: str) -> UserImportReport:
+    """Массовый импорт: валидация, проверка занятых имен, хеширование и вставка пачками"""
+    valid, errors = _validate(parse_rows(body, content_type))
+
+    users = []
+    for start in range(0, len(valid), INSERT_CHUNK_SIZE):
+        chunk = valid[start:start + INSERT_CHUNK_SIZE]
+        taken_usernames, taken_emails = await service.find_existing(
+            db, [user.username for _, user in chunk], [user.email for _, user in chunk]
+        )
+        for number, user in chunk:
+            if user.username in taken_usernames:
+                errors.append(UserImportError(row=number, error="Username already taken"))
+            elif user.email in taken_emails:
+                errors.append(UserImportError(row=number, error="Email already taken"))
+            else:
+                users.append((number, user))
+
+    hashed = await _hash_passwords([user.password for _, user in users])
+
+    created = 0
+    for start in range(0, len(users), INSERT_CHUNK_SIZE):
+        chunk = users[start:start + INSERT_CHUNK_SIZE]
+        rows = [
+            {
+                "username": user.username,
+                "email": user.email,
+                "password": password,
+                "role": user.role.value,
+            }
+            for (_, user), password in zip(chunk, hashed[start:start + INSERT_CHUNK_SIZE])
+        ]
+        try:
+            await service.bulk_insert_users(db, rows)
+            created += len(rows)
+        except IntegrityError:
+            # Конкурентная регистрация заняла имя между проверкой и вставкой: пачка повторяется
+            # по одной строке, чтобы отчет назвал именно конфликтующие строки
+            created += await _insert_rows_one_by_one(db, service, chunk, rows, errors)
+        except SQLAlchemyError:
+            errors.extend(UserImportError(row=number, error="Database error occurred") for number, _ in chunk)
+
+    errors.sort(key=lambda error: error.row)
+    return UserImportReport(created=created, errors=errors)
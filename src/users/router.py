@@ -1,45 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from src.users import schemas, services
-from src.database import get_db
+from src.users import schemas, services, importer
+from src.users.serializers import dump_user, dump_user_line, dump_user_rows, dump_users
+from src.config import settings
+from src.database import get_db, DB_ASYNC, ThreadpoolService
+from src.db_replicas import get_read_db, get_read_session_factory
 from src.security import get_current_user
 from src.users.models import User
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Асинхронный сервис для AsyncSession, синхронный выполняется в пуле потоков
+user_service = services.AsyncUserService if DB_ASYNC else ThreadpoolService(services.UserService)
+
+# Размер пачки строк серверного курсора при выгрузке
+EXPORT_BATCH_SIZE = 1000
+
 
 @router.get("/", response_model=List[schemas.UserResponse])
-def get_all_users(
+async def get_all_users(
+        response: Response,
+        limit: int = Query(100, ge=1, le=1000),
+        after: Optional[int] = Query(None, description="id последнего пользователя предыдущей страницы"),
+        db: Session = Depends(get_read_db),
+):
+    """Список пользователей с keyset-пагинацией; курсор следующей страницы в X-Next-Cursor"""
+    if settings.FAST_JSON:
+        rows = await user_service.get_users_page_rows(db, limit, after)
+        response = _json_response(dump_user_rows(rows))
+        if len(rows) == limit:
+            response.headers["X-Next-Cursor"] = str(rows[-1].id)
+        return response
+
+    users = await user_service.get_users_page(db, limit, after)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
+    return users
+
+
+def _json_response(content: bytes) -> Response:
+    """Готовый JSON: FastAPI не валидирует и не кодирует ответ повторно"""
+    return Response(content, media_type="application/json")
+
+
+def _users_response(users: List[User]):
+    return _json_response(dump_users(users)) if settings.FAST_JSON else users
+
+
+@router.get("/export")
+async def export_users(
+        sessions=Depends(get_read_session_factory),
+        current_user: User = Depends(get_current_user)
+):
+    """Потоковая выгрузка всех пользователей в NDJSON (только для админов)"""
+    if current_user.role != schemas.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    if DB_ASYNC:
+        async def lines():
+            async for user in services.AsyncUserService.iter_users(sessions, EXPORT_BATCH_SIZE):
+                yield dump_user_line(user)
+    else:
+        def lines():
+            for user in services.UserService.iter_users(sessions, EXPORT_BATCH_SIZE):
+                yield dump_user_line(user)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/import", response_model=schemas.UserImportReport)
+async def import_users(
+        request: Request,
         db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
 ):
-    return services.UserService.get_all_users(db)
+    """Массовый импорт пользователей из CSV или NDJSON (только для админов)"""
+    if current_user.role != schemas.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    return await importer.import_users(db, user_service, body, content_type)
+
+
+@router.post("/bulk/approve", response_model=List[schemas.UserResponse])
+async def bulk_approve_users(
+        bulk_data: schemas.UserBulkApprove,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """Одобрить или отклонить пользователей по списку id или фильтру (только для админов)"""
+    if current_user.role != schemas.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    users = await user_service.bulk_update_users(db, bulk_data, {"is_approved": bulk_data.is_approved})
+    return _users_response(users)
+
+
+@router.post("/bulk/change-role", response_model=List[schemas.UserResponse])
+async def bulk_change_user_role(
+        bulk_data: schemas.UserBulkChangeRole,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """Изменить роль пользователей по списку id или фильтру (только для админов)"""
+    if current_user.role != schemas.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    users = await user_service.bulk_update_users(db, bulk_data, {"role": bulk_data.role})
+    return _users_response(users)
+
+
+@router.post("/bulk/delete", response_model=List[schemas.UserResponse])
+async def bulk_delete_users(
+        bulk_data: schemas.UserBulkSelection,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """Удалить пользователей по списку id или фильтру (только для админов)"""
+    if current_user.role != schemas.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    users = await user_service.bulk_delete_users(db, bulk_data)
+    return _users_response(users)
 
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
-def get_user_by_id(
+async def get_user_by_id(
         user_id: int,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         current_user: User = Depends(get_current_user)
 ):
 
 
-    return services.UserService.get_user_by_id(db, user_id)
+    user = await user_service.get_user_by_id(db, user_id)
+    return _json_response(dump_user(user)) if settings.FAST_JSON else user
 
 
 
 @router.put("/{user_id}", response_model=schemas.UserResponse)
-def update_user(
+async def update_user(
         user_id: int,
         user_data: schemas.UserUpdate,
         db: Session = Depends(get_db),
 ):
-    return services.UserService.update_user(db, user_id, user_data)
+    return await user_service.update_user(db, user_id, user_data)
 
 
 @router.put("/{user_id}/change-password", response_model=schemas.UserResponse)
-def change_password(
+async def change_password(
         user_id: int,
         password_data: schemas.UserChangePassword,
         db: Session = Depends(get_db),
@@ -50,11 +162,11 @@ def change_password(
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    return services.UserService.change_password(db, user_id, password_data)
+    return await user_service.change_password(db, user_id, password_data)
 
 
 @router.put("/{user_id}/change-role", response_model=schemas.UserResponse)
-def change_user_role(
+async def change_user_role(
         user_id: int,
         role_data: schemas.UserChangeRole,
         db: Session = Depends(get_db),
@@ -64,25 +176,25 @@ def change_user_role(
     if current_user.role != schemas.UserRole.admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    return services.UserService.change_user_role(db, user_id, role_data)
+    return await user_service.change_user_role(db, user_id, role_data)
 
 
 @router.put("/{user_id}/approve", response_model=schemas.UserResponse)
-def approve_user(
+async def approve_user(
         user_id: int,
         approve_data: schemas.UserApproveRequest,
         db: Session = Depends(get_db),
 ):
 
 
-    return services.UserService.approve_user(db, user_id, approve_data)
+    return await user_service.approve_user(db, user_id, approve_data)
 
 
 @router.delete("/{user_id}")
-def delete_user(
+async def delete_user(
         user_id: int,
         db: Session = Depends(get_db),
 ):
 
-    services.UserService.delete_user(db, user_id)
+    await user_service.delete_user(db, user_id)
     return {"message": "User deleted successfully"}
\ No newline at end of file
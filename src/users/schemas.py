@@ -1,8 +1,8 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, List
 
-from pydantic import BaseModel, EmailStr, Field, field_validator, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, model_validator, ConfigDict
 
 
 class UserRole(str, Enum):
@@ -25,31 +25,13 @@ class UserUpdate(BaseModel):
     is_approved: Optional[bool] = None
     role: Optional[UserRole] = None
 
-    # Валидатор для проверки, что хотя бы одно поле заполнено
-    @field_validator('*', mode='before')
-    @classmethod
-    def check_at_least_one_field(cls, v, info: Any):
-        if info.field_name != 'password' and v is not None:
-            # Устанавливаем флаг, что есть данные для обновления
-            if not hasattr(cls, '_has_data'):
-                cls._has_data = True
-        return v
-
-    @field_validator('password', mode='before')
-    @classmethod
-    def check_password_or_other_fields(cls, v, info: Any):
-        if v is not None:
-            if not hasattr(cls, '_has_data'):
-                cls._has_data = True
-        return v
-
-    # Финальная проверка после валидации всех полей
-    @field_validator('*', mode='after')
-    @classmethod
-    def validate_all_fields(cls, v, info: Any):
-        if info.field_name == 'role' and not hasattr(cls, '_has_data'):
+    # Хотя бы одно поле должно быть заполнено; проверка на экземпляре, без состояния класса
+    @model_validator(mode='after')
+    def check_at_least_one_field(self):
+        if (self.username is None and self.email is None and self.password is None
+                and self.is_approved is None and self.role is None):
             raise ValueError('At least one field must be provided for update')
-        return v
+        return self
 
 
 # Для смены пароля
@@ -88,4 +70,42 @@ class UserResponse(UserBase):
     is_approved: bool
     role: UserRole
     created_at: Optional[datetime] = None
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Массовый импорт пользователей
+class UserImportError(BaseModel):
+    row: int
+    error: str
+
+
+class UserImportReport(BaseModel):
+    created: int
+    errors: List[UserImportError]
+
+
+# Массовые операции администратора
+class UserBulkFilter(BaseModel):
+    is_approved: Optional[bool] = None
+    role: Optional[UserRole] = None
+    # Пользователи, зарегистрированные раньше пользователя с этим id
+    id_before: Optional[int] = None
+
+
+class UserBulkSelection(BaseModel):
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=10000)
+    filter: Optional[UserBulkFilter] = None
+
+    @model_validator(mode='after')
+    def check_selection(self):
+        if not self.ids and not (self.filter and self.filter.model_dump(exclude_none=True)):
+            raise ValueError('Either ids or a non-empty filter must be provided')
+        return self
+
+
+class UserBulkApprove(UserBulkSelection):
+    is_approved: bool
+
+
+class UserBulkChangeRole(UserBulkSelection):
+    role: UserRole
@@ -0,0 +1,45 @@
+from typing import Iterable, List
+
+import orjson
+from pydantic import TypeAdapter
+
+from src.users.models import User
+from src.users.schemas import UserResponse
+
+# Колонки UserResponse: список читается кортежами без загрузки ORM-объектов
+USER_RESPONSE_COLUMNS = (User.id, User.username, User.email, User.is_approved, User.role)
+
+# Адаптеры создаются один раз: схема валидации и сериализации компилируется при импорте
+user_adapter = TypeAdapter(UserResponse)
+user_list_adapter = TypeAdapter(List[UserResponse])
+
+
+def _user_dict(user) -> dict:
+    """ORM-объект или строка с колонками USER_RESPONSE_COLUMNS в формате UserResponse"""
+    return {
+        "username": user.username,
+        "email": user.email,
+        "id": user.id,
+        "is_approved": user.is_approved,
+        "role": user.role.value,
+        "created_at": None,
+    }
+
+
+def dump_user_rows(rows: Iterable) -> bytes:
+    """JSON-массив пользователей напрямую из строк БД, без валидации pydantic"""
+    return orjson.dumps([_user_dict(row) for row in rows])
+
+
+def dump_user_line(user) -> bytes:
+    """Строка NDJSON для выгрузки"""
+    return orjson.dumps(_user_dict(user), option=orjson.OPT_APPEND_NEWLINE)
+
+
+def dump_user(user: User) -> bytes:
+    """Один пользователь через кешированный TypeAdapter: валидация и JSON за один проход в pydantic-core"""
+    return user_adapter.dump_json(user_adapter.validate_python(user, from_attributes=True))
+
+
+def dump_users(users: List[User]) -> bytes:
+    return user_list_adapter.dump_json(user_list_adapter.validate_python(users, from_attributes=True))
@@ -1,13 +1,60 @@
-from typing import Any, List
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
 from venv import logger
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, select, insert, update, delete, or_
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import logging
 from src.users.models import User, UserRole
-from src.users.schemas import UserUpdate, UserChangeRole, UserChangePassword, UserApproveRequest
-from src.security import get_password_hash, verify_password, create_access_token, create_refresh_token, verify_token
+from src.users.serializers import USER_RESPONSE_COLUMNS
+from src.users.schemas import UserUpdate, UserChangeRole, UserChangePassword, UserApproveRequest, UserBulkSelection
+from src.security import invalidate_cached_user, get_password_hash_pooled, verify_password_pooled, get_password_hash_async, verify_password_async, create_access_token, create_refresh_token, verify_token
+
+
+def _bulk_conditions(selection: UserBulkSelection) -> list:
+    """Условия WHERE для массовой операции по списку id и/или фильтру"""
+    conditions = []
+    if selection.ids:
+        conditions.append(User.id.in_(selection.ids))
+    if selection.filter is not None:
+        if selection.filter.is_approved is not None:
+            conditions.append(User.is_approved == selection.filter.is_approved)
+        if selection.filter.role is not None:
+            conditions.append(User.role == selection.filter.role)
+        if selection.filter.id_before is not None:
+            conditions.append(User.id < selection.filter.id_before)
+    return conditions
+
+
+# Уникальные ограничения users (имена PostgreSQL по умолчанию) и колонки для сообщений SQLite
+UNIQUE_VIOLATION_DETAILS = {
+    "users_username_key": "Username already taken",
+    "users_email_key": "Email already taken",
+}
+SQLITE_UNIQUE_PREFIX = "UNIQUE constraint failed: users."
+
+
+def _constraint_name(error: IntegrityError) -> Optional[str]:
+    orig = error.orig
+    # psycopg2: diag.constraint_name; asyncpg: исключение драйвера в __cause__ адаптера
+    name = getattr(getattr(orig, "diag", None), "constraint_name", None)
+    if name is None:
+        name = getattr(orig.__cause__, "constraint_name", None)
+    if name is None and str(orig).startswith(SQLITE_UNIQUE_PREFIX):
+        name = f"users_{str(orig)[len(SQLITE_UNIQUE_PREFIX):]}_key"
+    return name
+
+
+def integrity_error_detail(error: IntegrityError) -> str:
+    """Сообщение для нарушения уникальности username/email; для прочих нарушений - общее"""
+    return UNIQUE_VIOLATION_DETAILS.get(_constraint_name(error), "Database integrity error")
+
+
+def _invalidate_users(users: List[User]) -> None:
+    for user in users:
+        invalidate_cached_user(user.id)
 
 
 class UserService:
@@ -16,6 +63,35 @@ class UserService:
         """Получить всех пользователей"""
         return db.query(User).all()
 
+    @staticmethod
+    def get_users_page(db: Session, limit: int, after: Optional[int] = None) -> List[User]:
+        """Страница пользователей по ключу id (keyset-пагинация)"""
+        query = db.query(User).order_by(User.id)
+        if after is not None:
+            query = query.filter(User.id > after)
+        return query.limit(limit).all()
+
+    @staticmethod
+    def get_users_page_rows(db: Session, limit: int, after: Optional[int] = None) -> List[Row]:
+        """Та же страница строками с колонками UserResponse, без ORM-объектов"""
+        query = select(*USER_RESPONSE_COLUMNS).order_by(User.id).limit(limit)
+        if after is not None:
+            query = query.where(User.id > after)
+        return list(db.execute(query).all())
+
+    @staticmethod
+    def iter_users(sessions: sessionmaker, batch_size: int) -> Iterator[User]:
+        """Потоковое чтение всех пользователей серверным курсором в отдельной сессии"""
+        db = sessions()
+        try:
+            result = db.execute(
+                select(User).order_by(User.id).execution_options(yield_per=batch_size)
+            )
+            for user in result.scalars():
+                yield user
+        finally:
+            db.close()
+
     @staticmethod
     def get_user_by_id(db: Session, user_id: int) -> User:
         """Получить пользователя по ID"""
@@ -33,61 +109,122 @@ class UserService:
         return user
 
 
+    @staticmethod
+    def _update_returning(db: Session, user_id: int, values: Dict[str, Any]) -> User:
+        """UPDATE ... RETURNING одной командой вместо SELECT + UPDATE + refresh"""
+        try:
+            user = db.execute(
+                update(User).where(User.id == user_id).values(**values).returning(User)
+            ).scalars().first()
+            if user is None:
+                raise HTTPException(status_code=404, detail="User not found")
+            # Отсоединяем строку RETURNING, чтобы commit не сбросил ее атрибуты
+            db.expunge(user)
+            db.commit()
+        except HTTPException:
+            db.rollback()
+            raise
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=integrity_error_detail(e))
+        invalidate_cached_user(user_id)
+        return user
+
     @staticmethod
     def update_user(db: Session, user_id: int, user_data: UserUpdate) -> User:
         """Обновить данные пользователя"""
-        user = UserService.get_user_by_id(db, user_id)
-
         # Получаем только те поля, которые были переданы (не None)
         update_data = user_data.model_dump(exclude_unset=True)
+        if not update_data:
+            return UserService.get_user_by_id(db, user_id)
 
         if 'password' in update_data:
-            update_data['password'] = get_password_hash(update_data['password'])
+            update_data['password'] = get_password_hash_pooled(update_data['password'])
 
-        for field, value in update_data.items():
-            setattr(user, field, value)
-
-        db.commit()
-        db.refresh(user)
-        return user
+        return UserService._update_returning(db, user_id, update_data)
 
     @staticmethod
     def change_password(db: Session, user_id: int, password_data: UserChangePassword) -> User:
         """Сменить пароль пользователя"""
-        user = UserService.get_user_by_id(db, user_id)
+        current_hash = db.execute(select(User.password).where(User.id == user_id)).scalar()
+        if current_hash is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        # Транзакция закрывается до bcrypt: ожидание пула хеширования не держит соединение БД
+        db.rollback()
 
-        if not verify_password(password_data.current_password, user.password):
+        if not verify_password_pooled(password_data.current_password, current_hash):
             raise HTTPException(status_code=400, detail="Current password is incorrect")
 
-        user.password = get_password_hash(password_data.new_password)
-        db.commit()
-        db.refresh(user)
-        return user
+        new_hash = get_password_hash_pooled(password_data.new_password)
+        return UserService._update_returning(db, user_id, {"password": new_hash})
 
     @staticmethod
     def change_user_role(db: Session, user_id: int, role_data: UserChangeRole) -> User:
         """Изменить роль пользователя (только для админов)"""
-        user = UserService.get_user_by_id(db, user_id)
-        user.role = role_data.role
-        db.commit()
-        db.refresh(user)
-        return user
+        return UserService._update_returning(db, user_id, {"role": role_data.role})
 
     @staticmethod
     def approve_user(db: Session, user_id: int, approve_data: UserApproveRequest) -> User:
         """Одобрить или отклонить пользователя"""
-        user = UserService.get_user_by_id(db, user_id)
-        user.is_approved = approve_data.is_approved
-        db.commit()
-        db.refresh(user)
-        return user
+        return UserService._update_returning(db, user_id, {"is_approved": approve_data.is_approved})
 
     @staticmethod
     def delete_user(db: Session, user_id: int) -> None:
         """Удалить пользователя"""
-        user = UserService.get_user_by_id(db, user_id)
-        db.delete(user)
+        deleted = db.execute(delete(User).where(User.id == user_id).returning(User.id)).first()
+        if deleted is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="User not found")
+        db.commit()
+        invalidate_cached_user(user_id)
+
+    @staticmethod
+    def bulk_update_users(db: Session, selection: UserBulkSelection, values: Dict[str, Any]) -> List[User]:
+        """Массовое обновление одним UPDATE ... RETURNING"""
+        result = db.execute(
+            update(User).where(*_bulk_conditions(selection)).values(**values).returning(User)
+        )
+        users = list(result.scalars().all())
+        # Отсоединяем строки RETURNING, чтобы commit не сбросил их атрибуты
+        db.expunge_all()
         db.commit()
+        _invalidate_users(users)
+        return users
+
+    @staticmethod
+    def bulk_delete_users(db: Session, selection: UserBulkSelection) -> List[User]:
+        """Массовое удаление одним DELETE ... RETURNING"""
+        result = db.execute(
+            delete(User).where(*_bulk_conditions(selection)).returning(User)
+        )
+        users = list(result.scalars().all())
+        # Отсоединяем строки RETURNING, чтобы commit не сбросил их атрибуты
+        db.expunge_all()
+        db.commit()
+        _invalidate_users(users)
+        return users
+
+    @staticmethod
+    def find_existing(db: Session, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Занятые username и email одним запросом"""
+        rows = db.execute(
+            select(User.username, User.email).where(
+                or_(User.username.in_(usernames), User.email.in_(emails))
+            )
+        ).all()
+        # Дальше импорт долго хеширует пароли: соединение возвращается в пул
+        db.rollback()
+        return {row.username for row in rows}, {row.email for row in rows}
+
+    @staticmethod
+    def bulk_insert_users(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Вставка пачки пользователей одним многострочным INSERT"""
+        try:
+            db.execute(insert(User).values(rows))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
 
     @staticmethod
     def authenticate_user(db: Session, username: str, password: str) -> User:
@@ -95,7 +232,190 @@ class UserService:
         user = db.query(User).filter(User.username == username).first()
         if not user:
             return None
-        if not verify_password(password, user.password):
+        # Транзакция закрывается до bcrypt: ожидание пула хеширования не держит соединение БД
+        db.expunge(user)
+        db.rollback()
+        if not verify_password_pooled(password, user.password):
             return None
         return user
 
+
+class AsyncUserService:
+    """Асинхронная версия UserService для AsyncSession"""
+
+    @staticmethod
+    async def get_all_users(db: AsyncSession) -> List[User]:
+        """Получить всех пользователей"""
+        result = await db.execute(select(User))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_users_page(db: AsyncSession, limit: int, after: Optional[int] = None) -> List[User]:
+        """Страница пользователей по ключу id (keyset-пагинация)"""
+        query = select(User).order_by(User.id).limit(limit)
+        if after is not None:
+            query = query.where(User.id > after)
+        result = await db.execute(query)
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_users_page_rows(db: AsyncSession, limit: int, after: Optional[int] = None) -> List[Row]:
+        """Та же страница строками с колонками UserResponse, без ORM-объектов"""
+        query = select(*USER_RESPONSE_COLUMNS).order_by(User.id).limit(limit)
+        if after is not None:
+            query = query.where(User.id > after)
+        result = await db.execute(query)
+        return list(result.all())
+
+    @staticmethod
+    async def iter_users(sessions: async_sessionmaker, batch_size: int) -> AsyncIterator[User]:
+        """Потоковое чтение всех пользователей серверным курсором в отдельной сессии"""
+        async with sessions() as db:
+            result = await db.stream(
+                select(User).order_by(User.id).execution_options(yield_per=batch_size)
+            )
+            async for user in result.scalars():
+                yield user
+
+    @staticmethod
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> User:
+        """Получить пользователя по ID"""
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    @staticmethod
+    async def get_user_by_username(db: AsyncSession, username: str) -> User:
+        """Получить пользователя по username"""
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    @staticmethod
+    async def _update_returning(db: AsyncSession, user_id: int, values: Dict[str, Any]) -> User:
+        """UPDATE ... RETURNING одной командой вместо SELECT + UPDATE + refresh"""
+        try:
+            result = await db.execute(
+                update(User).where(User.id == user_id).values(**values).returning(User)
+            )
+            user = result.scalars().first()
+            if user is None:
+                raise HTTPException(status_code=404, detail="User not found")
+            await db.commit()
+        except HTTPException:
+            await db.rollback()
+            raise
+        except IntegrityError as e:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail=integrity_error_detail(e))
+        invalidate_cached_user(user_id)
+        return user
+
+    @staticmethod
+    async def update_user(db: AsyncSession, user_id: int, user_data: UserUpdate) -> User:
+        """Обновить данные пользователя"""
+        update_data = user_data.model_dump(exclude_unset=True)
+        if not update_data:
+            return await AsyncUserService.get_user_by_id(db, user_id)
+
+        if 'password' in update_data:
+            update_data['password'] = await get_password_hash_async(update_data['password'])
+
+        return await AsyncUserService._update_returning(db, user_id, update_data)
+
+    @staticmethod
+    async def change_password(db: AsyncSession, user_id: int, password_data: UserChangePassword) -> User:
+        """Сменить пароль пользователя"""
+        current_hash = await db.scalar(select(User.password).where(User.id == user_id))
+        if current_hash is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        # Транзакция закрывается до bcrypt: ожидание пула хеширования не держит соединение БД
+        await db.rollback()
+
+        if not await verify_password_async(password_data.current_password, current_hash):
+            raise HTTPException(status_code=400, detail="Current password is incorrect")
+
+        new_hash = await get_password_hash_async(password_data.new_password)
+        return await AsyncUserService._update_returning(db, user_id, {"password": new_hash})
+
+    @staticmethod
+    async def change_user_role(db: AsyncSession, user_id: int, role_data: UserChangeRole) -> User:
+        """Изменить роль пользователя (только для админов)"""
+        return await AsyncUserService._update_returning(db, user_id, {"role": role_data.role})
+
+    @staticmethod
+    async def approve_user(db: AsyncSession, user_id: int, approve_data: UserApproveRequest) -> User:
+        """Одобрить или отклонить пользователя"""
+        return await AsyncUserService._update_returning(db, user_id, {"is_approved": approve_data.is_approved})
+
+    @staticmethod
+    async def delete_user(db: AsyncSession, user_id: int) -> None:
+        """Удалить пользователя"""
+        result = await db.execute(delete(User).where(User.id == user_id).returning(User.id))
+        if result.first() is None:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="User not found")
+        await db.commit()
+        invalidate_cached_user(user_id)
+
+    @staticmethod
+    async def bulk_update_users(db: AsyncSession, selection: UserBulkSelection, values: Dict[str, Any]) -> List[User]:
+        """Массовое обновление одним UPDATE ... RETURNING"""
+        result = await db.execute(
+            update(User).where(*_bulk_conditions(selection)).values(**values).returning(User)
+        )
+        users = list(result.scalars().all())
+        await db.commit()
+        _invalidate_users(users)
+        return users
+
+    @staticmethod
+    async def bulk_delete_users(db: AsyncSession, selection: UserBulkSelection) -> List[User]:
+        """Массовое удаление одним DELETE ... RETURNING"""
+        result = await db.execute(
+            delete(User).where(*_bulk_conditions(selection)).returning(User)
+        )
+        users = list(result.scalars().all())
+        await db.commit()
+        _invalidate_users(users)
+        return users
+
+    @staticmethod
+    async def find_existing(db: AsyncSession, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Занятые username и email одним запросом"""
+        result = await db.execute(
+            select(User.username, User.email).where(
+                or_(User.username.in_(usernames), User.email.in_(emails))
+            )
+        )
+        rows = result.all()
+        # Дальше импорт долго хеширует пароли: соединение возвращается в пул
+        await db.rollback()
+        return {row.username for row in rows}, {row.email for row in rows}
+
+    @staticmethod
+    async def bulk_insert_users(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+        """Вставка пачки пользователей одним многострочным INSERT"""
+        try:
+            await db.execute(insert(User).values(rows))
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
+
+    @staticmethod
+    async def authenticate_user(db: AsyncSession, username: str, password: str) -> User:
+        """Аутентификация пользователя"""
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
+        if not user:
+            return None
+        # Транзакция закрывается до bcrypt: ожидание пула хеширования не держит соединение БД
+        db.expunge(user)
+        await db.rollback()
+        if not await verify_password_async(password, user.password):
+            return None
+        return user
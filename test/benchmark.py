@@ -0,0 +1,291 @@
+"""Нагрузочный бенчмарк горячих путей API.
+
+Запускает настоящее приложение из src/main.py в процессе (httpx + ASGITransport) против
+локальной БД (SQLite по умолчанию или Postgres через --database-url) и локального
+исполнителя задач вместо брокера. Для каждого сценария считает пропускную способность
+и задержки p50/p95/p99, результаты сохраняются в JSON и сравниваются с базовой линией.
+
+    python test/benchmark.py                          # прогон и сравнение с базовой линией
+    python test/benchmark.py --save-baseline          # сохранить результаты как базовую линию
+    python test/benchmark.py --rows 10000 --requests 200 --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = ROOT / "test" / "benchmark_baseline.json"
+
+# Окружение приложения задается до импорта src: задачи, отзывы токенов и ведра попыток входа
+# без Redis, без логирования SQL.
+# Контроль допуска остается включенным, как в работе: параллельность каждого сценария не выше
+# максимального лимита класса его маршрута, поэтому 503 в результатах - это снижение лимита
+# адаптивным контролем, а не переполнение клиентом.
+os.environ.setdefault("TASK_BACKEND", "local")
+os.environ.setdefault("TOKEN_REVOCATION_BACKEND", "local")
+os.environ.setdefault("LOGIN_THROTTLE_BACKEND", "local")
+# Класс ответа по умолчанию main выбирает при импорте: --fast-json должен попасть в окружение раньше
+if "--fast-json" in sys.argv:
+    os.environ["FAST_JSON"] = "true"
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker  # noqa: E402
+
+from src import database  # noqa: E402
+from src.admission import admission_stats, limiters, route_class  # noqa: E402
+from src.main import app  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.security import get_password_hash  # noqa: E402
+from src.users.models import User, user_role_enum  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def within_limit(method, path, concurrency):
+    """Параллельность сценария, не превышающая максимальный лимит допуска его маршрута"""
+    name = route_class(method, path)
+    if not settings.ADMISSION_CONTROL or name is None:
+        return concurrency
+    return min(concurrency, limiters[name].max_limit)
+
+
+async def measure(name, make_request, count, concurrency):
+    """Выполнить count запросов с заданной параллельностью и посчитать задержки"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    shed = 0
+
+    async def one(i):
+        nonlocal errors, shed
+        async with semaphore:
+            started = time.perf_counter()
+            response = await make_request(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+            if response.status_code == 503:
+                shed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    result = {
+        "requests": count,
+        "concurrency": concurrency,
+        "errors": errors,
+        "shed": shed,
+        "throughput_rps": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+    print(f"{name:<28} {result['throughput_rps']:>9} rps  p50 {result['p50_ms']:>8} ms  "
+          f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {errors} (503: {shed})")
+    return result
+
+
+async def prepare_database(url):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            await conn.run_sync(lambda sync_conn: user_role_enum.create(sync_conn, checkfirst=True))
+        await conn.run_sync(database.Base.metadata.drop_all)
+        await conn.run_sync(database.Base.metadata.create_all)
+
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[database.get_db] = get_db
+    return engine
+
+
+async def seed_users(engine, start, total, batch_size=5000):
+    """Массовая вставка пользователей с одним заранее посчитанным хешем пароля"""
+    password = get_password_hash(PASSWORD)
+    async with engine.begin() as conn:
+        for offset in range(start, total, batch_size):
+            rows = [
+                {
+                    "username": f"seed{i}",
+                    "email": f"seed{i}@example.com",
+                    "password": password,
+                    "is_approved": True,
+                    "role": "USER",
+                }
+                for i in range(offset, min(offset + batch_size, total))
+            ]
+            await conn.execute(insert(User), rows)
+
+
+async def run(args):
+    # Все входы идут с одного адреса: ограничение попыток входа исказило бы сценарий login
+    settings.LOGIN_THROTTLE_ENABLED = False
+    url = args.database_url or f"sqlite+aiosqlite:///{Path(tempfile.gettempdir()) / 'benchmark.db'}"
+    engine = await prepare_database(url)
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        run_id = int(time.time())
+
+        async def register(i):
+            return await client.post("/auth/register", json={
+                "username": f"bench{run_id}_{i}",
+                "email": f"bench{run_id}_{i}@example.com",
+                "password": PASSWORD,
+            })
+        results["register"] = await measure(
+            "register", register, args.auth_requests, within_limit("POST", "/auth/register", args.concurrency)
+        )
+
+        async def login(i):
+            return await client.post("/auth/login", json={
+                "username": f"bench{run_id}_{i % args.auth_requests}",
+                "password": PASSWORD,
+            })
+        results["login"] = await measure(
+            "login", login, args.auth_requests, within_limit("POST", "/auth/login", args.concurrency)
+        )
+
+        tokens = (await login(0)).json()
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+        async def get_user(i):
+            return await client.get(f"/users/{tokens['user_id']}", headers=headers)
+        results["get_user_authenticated"] = await measure(
+            "get_user_authenticated", get_user, args.requests,
+            within_limit("GET", f"/users/{tokens['user_id']}", args.concurrency)
+        )
+
+        seeded = 0
+        for rows in args.rows:
+            await seed_users(engine, seeded, rows)
+            seeded = rows
+
+            async def list_first_page(i):
+                return await client.get("/users/", params={"limit": 100})
+            results[f"list_users_{rows}"] = await measure(
+                f"list_users_{rows}", list_first_page, args.requests, within_limit("GET", "/users/", args.concurrency)
+            )
+
+            async def list_deep_page(i):
+                return await client.get("/users/", params={"limit": 100, "after": rows - 200})
+            results[f"list_users_{rows}_deep"] = await measure(
+                f"list_users_{rows}_deep", list_deep_page, args.requests,
+                within_limit("GET", "/users/", args.concurrency)
+            )
+
+        task_ids = []
+
+        async def enqueue(i):
+            response = await client.post("/process-text", params={"text": f"benchmark {run_id} {i}"})
+            task_ids.append(response.json().get("task_id"))
+            return response
+        results["task_enqueue"] = await measure(
+            "task_enqueue", enqueue, args.requests, within_limit("POST", "/process-text", args.concurrency)
+        )
+
+        async def task_status(i):
+            return await client.get(f"/task/{task_ids[i % len(task_ids)]}")
+        results["task_status"] = await measure(
+            "task_status", task_status, args.requests, within_limit("GET", f"/task/{task_ids[0]}", args.concurrency)
+        )
+
+    await engine.dispose()
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "task_backend": os.environ["TASK_BACKEND"],
+            "concurrency": args.concurrency,
+            "admission_control": settings.ADMISSION_CONTROL,
+            "fast_json": settings.FAST_JSON,
+        },
+        "results": results,
+        # Лимиты классов после прогона: адаптивный лимит не должен падать без перегрузки
+        "admission": admission_stats(),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Сравнить p95 и пропускную способность с базовой линией; вернуть список регрессий"""
+    regressions = []
+    print(f"\nСравнение с базовой линией ({baseline['meta'].get('commit')}, допуск {tolerance:.0%}):")
+    for name, current in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        p95_change = current["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0.0
+        rps_change = current["throughput_rps"] / previous["throughput_rps"] - 1 if previous["throughput_rps"] else 0.0
+        marker = ""
+        if p95_change > tolerance or rps_change < -tolerance:
+            regressions.append(name)
+            marker = "  <- регрессия"
+        print(f"{name:<28} p95 {p95_change:+7.1%}  rps {rps_change:+7.1%}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих путей API")
+    parser.add_argument("--database-url", help="async URL БД (по умолчанию временный SQLite)")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000],
+                        help="размеры таблицы users для сценариев списка")
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    parser.add_argument("--auth-requests", type=int, default=50,
+                        help="запросов на регистрацию/вход (bcrypt медленный)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fast-json", action="store_true", help="включить быстрый JSON (FAST_JSON)")
+    parser.add_argument("--output", type=Path, help="сохранить отчет в JSON")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить отчет как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение p95/rps")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nБазовая линия сохранена: {args.baseline}")
+        return 0
+    if args.baseline.exists():
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,74 @@
+"""Микробенчмарк сериализации списка пользователей.
+
+Сравнивает стандартный путь FastAPI (response_model: валидация pydantic, jsonable-словарь,
+json.dumps) с быстрым путем FAST_JSON: кешированный TypeAdapter для ORM-объектов и orjson
+напрямую из строк БД. БД не нужна: объекты и строки создаются в памяти.
+
+    python test/benchmark_serialization.py --sizes 100 1000 10000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from src.users.models import User, UserRole  # noqa: E402
+from src.users.schemas import UserResponse  # noqa: E402
+from src.users.serializers import dump_user_rows, dump_users  # noqa: E402
+
+UserRow = namedtuple("UserRow", ["id", "username", "email", "is_approved", "role"])
+
+response_field = create_model_field(name="Response", type_=List[UserResponse], mode="serialization")
+
+
+def make_users(count):
+    return [
+        User(id=i, username=f"user{i}", email=f"user{i}@example.com", password="x",
+             is_approved=bool(i % 2), role=UserRole.USER)
+        for i in range(count)
+    ]
+
+
+def fastapi_default(users):
+    content = asyncio.run(serialize_response(field=response_field, response_content=users))
+    return JSONResponse(content).body
+
+
+def best_of(func, arg, repeat):
+    """Лучшее время из repeat прогонов, мс"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(arg)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк сериализации пользователей")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'users':>7} {'fastapi, ms':>12} {'adapter, ms':>12} {'rows, ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        users = make_users(size)
+        rows = [UserRow(u.id, u.username, u.email, u.is_approved, u.role) for u in users]
+        assert dump_user_rows(rows) == dump_users(users)
+
+        default = best_of(fastapi_default, users, args.repeat)
+        adapter = best_of(dump_users, users, args.repeat)
+        direct = best_of(dump_user_rows, rows, args.repeat)
+        print(f"{size:>7} {default:>12.2f} {adapter:>12.2f} {direct:>10.2f} {default / direct:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
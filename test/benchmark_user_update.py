@@ -0,0 +1,88 @@
+"""Микробенчмарк валидации UserUpdate (тело PUT /users/{user_id}).
+
+Сравнивает прежнюю схему (три field_validator('*') на каждое поле и флаг _has_data
+на классе) с текущей (один model_validator). Прежняя схема воспроизведена здесь,
+чтобы сравнение оставалось воспроизводимым.
+
+    python test/benchmark_user_update.py --number 100000
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validator  # noqa: E402
+
+from src.users.schemas import UserRole, UserUpdate  # noqa: E402
+
+
+class LegacyUserUpdate(BaseModel):
+    username: Optional[str] = Field(None, min_length=3, max_length=50)
+    email: Optional[EmailStr] = None
+    password: Optional[str] = Field(None, min_length=6)
+    is_approved: Optional[bool] = None
+    role: Optional[UserRole] = None
+
+    @field_validator('*', mode='before')
+    @classmethod
+    def check_at_least_one_field(cls, v, info: Any):
+        if info.field_name != 'password' and v is not None:
+            if not hasattr(cls, '_has_data'):
+                cls._has_data = True
+        return v
+
+    @field_validator('password', mode='before')
+    @classmethod
+    def check_password_or_other_fields(cls, v, info: Any):
+        if v is not None:
+            if not hasattr(cls, '_has_data'):
+                cls._has_data = True
+        return v
+
+    @field_validator('*', mode='after')
+    @classmethod
+    def validate_all_fields(cls, v, info: Any):
+        if info.field_name == 'role' and not hasattr(cls, '_has_data'):
+            raise ValueError('At least one field must be provided for update')
+        return v
+
+
+PAYLOADS = {
+    "one_field": {"is_approved": True},
+    "typical": {"username": "new_name", "role": "MANAGER_PROJECT"},
+    "all_fields": {
+        "username": "new_name", "email": "new@example.com", "password": "secret-password",
+        "is_approved": True, "role": "ADMIN",
+    },
+}
+
+
+def rejects_empty(model) -> bool:
+    try:
+        model.model_validate({})
+    except ValidationError:
+        return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк валидации UserUpdate")
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<12} {'legacy, us':>11} {'current, us':>12} {'speedup':>8}")
+    for name, payload in PAYLOADS.items():
+        legacy = timeit.timeit(lambda: LegacyUserUpdate.model_validate(payload), number=args.number)
+        current = timeit.timeit(lambda: UserUpdate.model_validate(payload), number=args.number)
+        print(f"{name:<12} {legacy / args.number * 1e6:>11.2f} {current / args.number * 1e6:>12.2f} "
+              f"{legacy / current:>7.1f}x")
+
+    # После первого запроса с данными прежняя схема перестает отклонять пустое обновление
+    print(f"\nempty update rejected: legacy={rejects_empty(LegacyUserUpdate)}, current={rejects_empty(UserUpdate)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Чтение с реплик: два файла SQLite вместо основной БД и реплики.
+
+    pip install -r requirements-test.txt
+    python -m pytest test/test_db_replicas.py
+"""
+import asyncio
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import database, db_replicas  # noqa: E402
+from src.db_replicas import (  # noqa: E402
+    READ_YOUR_WRITES_COOKIE, Replica, get_read_db, read_your_writes_middleware, recent_writers, replica_set,
+)
+
+
+def make_database(path: Path, name: str):
+    """Файл БД с одной строкой name; движок и фабрика сессий в режиме DB_ASYNC приложения"""
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+        conn.execute("INSERT INTO items VALUES (?)", (name,))
+    if database.DB_ASYNC:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        return engine, async_sessionmaker(engine, expire_on_commit=False)
+    engine = create_engine(f"sqlite:///{path}")
+    return engine, sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def routed(tmp_path, monkeypatch):
+    """Клиент приложения с чтением через get_read_db и реплика, которой управляет тест"""
+    primary_engine, primary_sessions = make_database(tmp_path / "primary.db", "primary")
+    replica_engine, replica_sessions = make_database(tmp_path / "replica.db", "replica")
+
+    replica = Replica("replica", replica_engine, replica_sessions)
+    asyncio.run(replica.check())
+    monkeypatch.setattr(replica_set, "replicas", [replica])
+    monkeypatch.setattr(replica_set, "stats", {key: 0 for key in replica_set.stats})
+    recent_writers.clear()
+
+    app = FastAPI()
+    app.middleware("http")(read_your_writes_middleware)
+
+    if database.DB_ASYNC:
+        async def get_primary():
+            async with primary_sessions() as db:
+                yield db
+    else:
+        def get_primary():
+            db = primary_sessions()
+            try:
+                yield db
+            finally:
+                db.close()
+    app.dependency_overrides[database.get_db] = get_primary
+
+    @app.get("/items")
+    async def read_items(db=Depends(get_read_db)):
+        query = text("SELECT name FROM items")
+        result = await db.execute(query) if isinstance(db, AsyncSession) else db.execute(query)
+        return [row.name for row in result]
+
+    @app.post("/items")
+    async def write_items():
+        return {}
+
+    yield TestClient(app), replica
+
+    for engine in (primary_engine, replica_engine):
+        if database.DB_ASYNC:
+            asyncio.run(engine.dispose())
+        else:
+            engine.dispose()
+
+
+def test_reads_go_to_healthy_replica(routed):
+    client, replica = routed
+    assert replica.healthy
+    assert client.get("/items").json() == ["replica"]
+    assert replica_set.stats["replica_reads"] == 1
+
+
+def test_write_cookie_routes_reads_to_primary(routed):
+    client, _ = routed
+    response = client.post("/items")
+    assert READ_YOUR_WRITES_COOKIE in response.cookies
+    assert client.get("/items").json() == ["primary"]
+    assert replica_set.stats["read_your_writes"] == 1
+
+    # Окно истекло
+    client.cookies.set(READ_YOUR_WRITES_COOKIE, f"{time.time() - 1:.3f}")
+    assert client.get("/items").json() == ["replica"]
+
+
+def test_write_with_authorization_routes_same_token_to_primary(routed):
+    client, _ = routed
+    client.post("/items", headers={"Authorization": "Bearer writer"})
+    # Клиент API не хранит cookie: узнается по заголовку Authorization
+    client.cookies.clear()
+    assert client.get("/items", headers={"Authorization": "Bearer writer"}).json() == ["primary"]
+    assert client.get("/items", headers={"Authorization": "Bearer reader"}).json() == ["replica"]
+
+
+def test_failed_write_keeps_reads_on_replica(routed):
+    client, _ = routed
+    response = client.post("/missing")
+    assert response.status_code == 404
+    assert READ_YOUR_WRITES_COOKIE not in response.cookies
+    assert client.get("/items").json() == ["replica"]
+
+
+def test_unhealthy_replica_falls_back_to_primary(routed, monkeypatch):
+    client, replica = routed
+
+    async def broken():
+        raise OSError("connection refused")
+    monkeypatch.setattr(replica, "measure_lag", broken)
+    asyncio.run(replica.check())
+
+    assert not replica.healthy
+    assert replica.error == "connection refused"
+    assert client.get("/items").json() == ["primary"]
+    assert replica_set.stats["fallbacks"] == 1
+
+
+def test_lagging_replica_leaves_and_rejoins_rotation(routed, monkeypatch):
+    client, replica = routed
+    lag = {"seconds": db_replicas.DB_REPLICA_MAX_LAG_SECONDS + 1}
+
+    async def measure():
+        return lag["seconds"]
+    monkeypatch.setattr(replica, "measure_lag", measure)
+
+    asyncio.run(replica.check())
+    assert not replica.healthy
+    assert client.get("/items").json() == ["primary"]
+
+    lag["seconds"] = 0.0
+    asyncio.run(replica.check())
+    assert replica.healthy
+    assert client.get("/items").json() == ["replica"]
+
+
+def test_without_replicas_reads_use_primary(routed, monkeypatch):
+    client, _ = routed
+    monkeypatch.setattr(replica_set, "replicas", [])
+    assert client.get("/items").json() == ["primary"]
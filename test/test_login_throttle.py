@@ -0,0 +1,111 @@
+"""Ограничение попыток входа: Lua-скрипт token bucket на fakeredis и ведра в памяти процесса.
+
+    pip install -r requirements-test.txt
+    python -m pytest test/test_login_throttle.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.auth import throttling  # noqa: E402
+from src.auth.throttling import LoginThrottle  # noqa: E402
+from src.config import settings  # noqa: E402
+
+IP = "10.0.0.1"
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def use_backend(monkeypatch, server, backend: str) -> LoginThrottle:
+    clients = {}
+
+    def get_redis():
+        # Клиент создается в цикле событий теста
+        if "client" not in clients:
+            clients["client"] = fakeredis.FakeAsyncRedis(server=server)
+        return clients["client"]
+
+    monkeypatch.setattr(throttling, "LOCAL_THROTTLE", backend == "local")
+    monkeypatch.setattr(throttling, "get_redis", get_redis)
+    monkeypatch.setattr(settings, "LOGIN_THROTTLE_ENABLED", True)
+    return LoginThrottle()
+
+
+@pytest.fixture(params=["redis", "local"])
+def throttle(request, monkeypatch, server):
+    return use_backend(monkeypatch, server, request.param)
+
+
+async def attempts(throttle: LoginThrottle, count: int, username: str = "alice", ip: str = IP) -> None:
+    for _ in range(count):
+        await throttle.check(username, ip)
+
+
+def test_eleventh_attempt_is_throttled(throttle):
+    async def scenario():
+        await attempts(throttle, settings.LOGIN_USER_BURST)
+        with pytest.raises(HTTPException) as error:
+            await throttle.check("alice", IP)
+        assert error.value.status_code == 429
+        assert int(error.value.headers["Retry-After"]) >= 1
+        assert throttle.stats()["throttled_username"] == 1
+        assert throttle.stats()["redis_fallbacks"] == 0
+        # Другой пользователь с того же адреса не затронут
+        await throttle.check("bob", IP)
+
+    asyncio.run(scenario())
+
+
+def test_ip_bucket_limits_many_usernames(throttle):
+    async def scenario():
+        for i in range(settings.LOGIN_IP_BURST):
+            await throttle.check(f"user{i}", IP)
+        with pytest.raises(HTTPException) as error:
+            await throttle.check("someone", IP)
+        assert error.value.status_code == 429
+        assert throttle.stats()["throttled_ip"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_reset_user_after_successful_login(throttle):
+    async def scenario():
+        await attempts(throttle, settings.LOGIN_USER_BURST)
+        await throttle.reset_user("alice")
+        await throttle.check("alice", IP)
+
+    asyncio.run(scenario())
+
+
+def test_username_is_case_normalised(throttle):
+    async def scenario():
+        await attempts(throttle, settings.LOGIN_USER_BURST, username="Alice")
+        with pytest.raises(HTTPException):
+            await throttle.check(" alice ", "10.0.0.2")
+
+    asyncio.run(scenario())
+
+
+def test_falls_back_to_local_buckets_when_redis_fails(monkeypatch, server):
+    throttle = use_backend(monkeypatch, server, "redis")
+    server.connected = False
+
+    async def scenario():
+        await attempts(throttle, settings.LOGIN_USER_BURST)
+        with pytest.raises(HTTPException) as error:
+            await throttle.check("alice", IP)
+        assert error.value.status_code == 429
+        stats = throttle.stats()
+        assert stats["backend"] == "local"
+        assert stats["redis_fallbacks"] == settings.LOGIN_USER_BURST + 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,137 @@
+"""Отзыв токенов и ротация refresh-токенов: Redis (fakeredis с Lua) и режим одного процесса.
+
+    pip install -r requirements-test.txt
+    python -m pytest test/test_token_revocation.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import security, token_revocation  # noqa: E402
+from src.auth import services  # noqa: E402
+from src.security import create_access_token, create_refresh_token, new_token_id, verify_token  # noqa: E402
+from src.token_revocation import BloomFilter, TokenRevocationStore  # noqa: E402
+
+
+@pytest.fixture(params=["redis", "local"])
+def store(request, monkeypatch):
+    """Новое хранилище отзывов, подключенное к проверке токенов, на fakeredis или в памяти"""
+    server = fakeredis.FakeServer()
+    clients = {}
+
+    def get_redis():
+        # Клиент создается в цикле событий теста
+        if "client" not in clients:
+            clients["client"] = fakeredis.FakeAsyncRedis(server=server)
+        return clients["client"]
+
+    monkeypatch.setattr(token_revocation, "LOCAL_REVOCATION", request.param == "local")
+    monkeypatch.setattr(token_revocation, "get_redis", get_redis)
+    revocations = TokenRevocationStore()
+    monkeypatch.setattr(services, "revocation_store", revocations)
+    monkeypatch.setattr(security, "revocation_checks", [revocations.is_revoked])
+    return revocations
+
+
+def login_tokens():
+    claims = {"sub": "1", "fam": new_token_id()}
+    return create_access_token(claims), create_refresh_token(claims)
+
+
+async def refresh(token: str) -> dict:
+    return await services.UserService.refresh_tokens(token)
+
+
+def test_refresh_rotates_tokens(store):
+    async def scenario():
+        _, refresh_token = login_tokens()
+        first = await refresh(refresh_token)
+        second = await refresh(first["refresh_token"])
+        assert verify_token(second["access_token"])["sub"] == "1"
+        assert store.stats()["rotations"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_refresh_reuse_revokes_family(store):
+    async def scenario():
+        access_token, refresh_token = login_tokens()
+        rotated = await refresh(refresh_token)
+
+        with pytest.raises(HTTPException) as error:
+            await refresh(refresh_token)
+        assert error.value.status_code == 401
+        assert error.value.detail == "Refresh token reuse detected"
+
+        # Все токены семейства, в том числе выданные после ротации, отозваны
+        assert verify_token(access_token) is None
+        assert verify_token(rotated["access_token"]) is None
+        with pytest.raises(HTTPException) as error:
+            await refresh(rotated["refresh_token"])
+        assert error.value.status_code == 401
+        assert store.stats()["reuse_detected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_logout_revokes_access_and_refresh(store):
+    async def scenario():
+        access_token, refresh_token = login_tokens()
+        other_access, _ = login_tokens()
+
+        await store.revoke_session(verify_token(access_token))
+
+        assert verify_token(access_token) is None
+        assert verify_token(refresh_token) is None
+        with pytest.raises(HTTPException) as error:
+            await refresh(refresh_token)
+        assert error.value.status_code == 401
+        # Другой вход того же пользователя не затронут
+        assert verify_token(other_access) is not None
+
+    asyncio.run(scenario())
+
+
+def test_revocation_is_loaded_by_other_process(store):
+    if token_revocation.LOCAL_REVOCATION:
+        pytest.skip("в режиме local отзывы не покидают процесс")
+
+    async def scenario():
+        access_token, _ = login_tokens()
+        claims = verify_token(access_token)
+        # Другой процесс: свое хранилище в памяти, тот же Redis
+        other = TokenRevocationStore()
+        assert not other.is_revoked(claims)
+
+        await store.revoke_session(claims)
+        await other.sync()
+        assert other.is_revoked(claims)
+
+    asyncio.run(scenario())
+
+
+def test_bloom_false_positive_does_not_reject_valid_token(store):
+    access_token, _ = login_tokens()
+    claims = verify_token(access_token)
+    # Биты фильтра совпали, но в точной карте отзыва нет
+    store._filter.add("jti:" + claims["jti"])
+
+    assert verify_token(access_token) is not None
+    assert store.stats()["false_positives"] >= 1
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"jti:{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"fam:{i}" in bloom for i in range(10000))
+    assert false_positives < 10000 * 0.03